@@ -1,8 +1,34 @@
-from django.contrib import admin
-from .models import Document
+from django.contrib import admin, messages
+from django.utils.text import format_lazy
+
+from .models import Document, DocumentStatus, Project
+from .transitions import transition
 
 
 # Register your models here.
 
 
 admin.site.register([Document])
+
+
+def transition_action(target):
+    def move(modeladmin, request, queryset):
+        report = transition(queryset, target)
+        modeladmin.message_user(request, f"{report.moved_count} projects moved to {target.label}.")
+        if report.skipped:
+            skipped = ", ".join(f"#{pk} {reason}" for pk, reason in sorted(report.skipped.items())[:20])
+            more = f" and {len(report.skipped) - 20} more" if len(report.skipped) > 20 else ""
+            modeladmin.message_user(request, f"Skipped {skipped}{more}.", messages.WARNING)
+
+    move.__name__ = f"move_to_{target.name.lower()}"
+    return admin.action(description=format_lazy("Move selected projects to {}", target.label))(move)
+
+
+@admin.register(Project)
+class ProjectAdmin(admin.ModelAdmin):
+    list_display = ("id", "student", "supervisor", "status", "document_count")
+    list_filter = ("status",)
+    list_select_related = ("student", "supervisor")
+    search_fields = ("student__username", "supervisor__username")
+    raw_id_fields = ("student", "supervisor", "reviewers", "final_version", "latest_document")
+    actions = [transition_action(DocumentStatus.get(target)) for target in DocumentStatus.__transitions__]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class EgraduConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "egradu"
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
@@ -0,0 +1,198 @@
+import csv
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import history
+from .fragments import SUPERVISOR_SECTIONS, invalidate_sections
+from .models import Contact, DocumentStatus, Project, UserType
+from .roles import invalidate_roles
+
+
+User = get_user_model()
+
+USER_FIELDS = ("email", "first_name", "last_name")
+
+
+class CohortError(Exception):
+    pass
+
+
+@dataclass
+class ImportReport:
+    created_users: int = 0
+    updated_users: int = 0
+    created_contacts: int = 0
+    added_roles: int = 0
+    created_projects: int = 0
+    errors: list = field(default_factory=list)
+
+
+def csv_records(file):
+    # username, email, first_name, last_name, roles separated by ";" and the
+    # supervisor's username for students that start a project.
+    for record in csv.DictReader(file):
+        yield {key.strip(): (value or "").strip() for key, value in record.items() if key}
+
+
+def json_records(file, chunk_size=64 * 1024):
+    # Objects of a top-level array or one object per line, decoded as the
+    # file is read so the whole document is never held in memory.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    for chunk in iter(lambda: file.read(chunk_size), ""):
+        buffer += chunk
+        while True:
+            buffer = buffer.lstrip(" \t\r\n,[")
+            if not buffer or buffer[0] == "]":
+                break
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break
+            if not isinstance(record, dict):
+                raise CohortError("Every JSON record has to be an object")
+            yield record
+            buffer = buffer[end:]
+    if buffer.strip() not in ("", "]"):
+        raise CohortError("The JSON input ends in an incomplete record")
+
+
+def records_for(name, file):
+    if name.lower().endswith(".csv"):
+        return csv_records(file)
+    if name.lower().endswith((".json", ".jsonl")):
+        return json_records(file)
+    raise CohortError("Only .csv, .json and .jsonl files can be imported")
+
+
+def clean_record(record, user_types):
+    cleaned = {}
+    for name in ("username",) + USER_FIELDS:
+        value = str(record.get(name) or "").strip()
+        if name == "username" and not value:
+            raise ValidationError("username is required")
+        if value:
+            User._meta.get_field(name).run_validators(value)
+        cleaned[name] = value
+    roles = record.get("roles") or []
+    if isinstance(roles, str):
+        roles = roles.split(";")
+    roles = {str(role).strip() for role in roles} - {""}
+    unknown = roles - set(user_types)
+    if unknown:
+        raise ValidationError(f"unknown roles {', '.join(sorted(unknown))}")
+    cleaned["roles"] = [user_types[role] for role in sorted(roles)]
+    cleaned["supervisor"] = str(record.get("supervisor") or "").strip()
+    return cleaned
+
+
+def import_records(records, dry_run=False):
+    # Users, contacts and roles are written one batch of records at a time,
+    # projects at the end once every supervisor in the file exists. Any
+    # error rolls the whole import back, so a fixed file can be re-run.
+    report = ImportReport()
+    batch_size = getattr(settings, "EGRADU_IMPORT_BATCH_SIZE", 1000)
+    user_types = {user_type.identifier: user_type.pk for user_type in UserType.objects.all()}
+    user_ids = {}
+    projects = []
+
+    with transaction.atomic():
+        records = enumerate(records, 1)
+        while batch := list(islice(records, batch_size)):
+            cleaned = []
+            for line, record in batch:
+                try:
+                    cleaned.append(clean_record(record, user_types))
+                except ValidationError as error:
+                    report.errors.append((line, "; ".join(error.messages)))
+                    continue
+                if cleaned[-1]["supervisor"]:
+                    projects.append((line, cleaned[-1]["username"], cleaned[-1]["supervisor"]))
+            user_ids.update(import_users(cleaned, report))
+
+        import_projects(projects, user_ids, report, batch_size)
+        if dry_run or report.errors:
+            transaction.set_rollback(True)
+        else:
+            # Bulk writes send no signals, see signals.project_saved and
+            # contact_types_changed.
+            invalidate_roles(*user_ids.values())
+    return report
+
+
+def import_users(records, report):
+    records = {record["username"]: record for record in records}
+    existing = {user.username: user for user in User.objects.filter(username__in=records)}
+
+    changed = []
+    for user in existing.values():
+        record = records[user.username]
+        updates = {name: record[name] for name in USER_FIELDS if record[name] and getattr(user, name) != record[name]}
+        if updates:
+            for name, value in updates.items():
+                setattr(user, name, value)
+            changed.append(user)
+    User.objects.bulk_update(changed, USER_FIELDS)
+    report.updated_users += len(changed)
+
+    created = User.objects.bulk_create(
+        User(password=make_password(None), **{name: record[name] for name in ("username",) + USER_FIELDS})
+        for username, record in records.items() if username not in existing
+    )
+    report.created_users += len(created)
+    users = {**existing, **{user.username: user for user in created}}
+
+    contacts = {contact.user_id: contact for contact in Contact.objects.filter(user__in=users.values())}
+    new_contacts = Contact.objects.bulk_create(
+        Contact(user=user) for user in users.values() if user.pk not in contacts
+    )
+    report.created_contacts += len(new_contacts)
+    contacts.update((contact.user_id, contact) for contact in new_contacts)
+
+    through = Contact.types.through
+    linked = set(
+        through.objects.filter(contact__in=contacts.values()).values_list("contact_id", "usertype_id")
+    )
+    links = {
+        (contacts[user.pk].pk, user_type)
+        for username, user in users.items()
+        for user_type in records[username]["roles"]
+    } - linked
+    through.objects.bulk_create(through(contact_id=contact, usertype_id=user_type) for contact, user_type in links)
+    report.added_roles += len(links)
+    return {username: user.pk for username, user in users.items()}
+
+
+def import_projects(projects, user_ids, report, batch_size):
+    pending = iter(projects)
+    while batch := list(islice(pending, batch_size)):
+        supervisors = {supervisor for _, _, supervisor in batch if supervisor not in user_ids}
+        user_ids.update(User.objects.filter(username__in=supervisors).values_list("username", "pk"))
+        started = dict(
+            Project.objects.filter(student__in=[user_ids[student] for _, student, _ in batch])
+            .values_list("student", "supervisor")
+        )
+
+        new = []
+        for line, student, supervisor in batch:
+            if supervisor not in user_ids:
+                report.errors.append((line, f"supervisor {supervisor} does not exist"))
+                continue
+            student_id, supervisor_id = user_ids[student], user_ids[supervisor]
+            if student_id not in started:
+                new.append(Project(student_id=student_id, supervisor_id=supervisor_id))
+                started[student_id] = supervisor_id
+            elif started[student_id] != supervisor_id:
+                report.errors.append((line, f"{student} already has a project with another supervisor"))
+        Project.objects.bulk_create(new)
+        report.created_projects += len(new)
+
+        history.record([(project.pk, project.supervisor_id, None, DocumentStatus.DRAFT) for project in new])
+        invalidate_sections([project.supervisor_id for project in new], *SUPERVISOR_SECTIONS)
@@ -0,0 +1,19 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.decorators import login_required as sync_login_required
+from django.contrib.auth.views import redirect_to_login
+
+
+def login_required(view_func):
+    # django.contrib.auth's decorator only supports async views from 5.0.
+    if not iscoroutinefunction(view_func):
+        return sync_login_required(view_func)
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        if await sync_to_async(lambda: request.user.is_authenticated)():
+            return await view_func(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path())
+
+    return wrapper
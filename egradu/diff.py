@@ -0,0 +1,67 @@
+import re
+from difflib import SequenceMatcher
+
+from .models import DocumentDiff, DocumentText
+from .storage import file_digest
+
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def sentence_ops(old, new):
+    old_sentences = [s for paragraph in old for s in SENTENCE_RE.split(paragraph)]
+    new_sentences = [s for paragraph in new for s in SENTENCE_RE.split(paragraph)]
+    ops = []
+    matcher = SequenceMatcher(None, old_sentences, new_sentences, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(["equal", " ".join(old_sentences[i1:i2])])
+            continue
+        if i1 < i2:
+            ops.append(["delete", " ".join(old_sentences[i1:i2])])
+        if j1 < j2:
+            ops.append(["insert", " ".join(new_sentences[j1:j2])])
+    return ops
+
+
+def compute_hunks(old_paragraphs, new_paragraphs):
+    # Only changed paragraphs are kept. Rewritten paragraphs are refined to
+    # sentence level so a one-word fix does not show as a whole new paragraph.
+    hunks = []
+    matcher = SequenceMatcher(None, old_paragraphs, new_paragraphs, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        hunk = {
+            "op": tag,
+            "old_start": i1 + 1,
+            "new_start": j1 + 1,
+            "old": old_paragraphs[i1:i2],
+            "new": new_paragraphs[j1:j2],
+        }
+        if tag == "replace":
+            hunk["sentences"] = sentence_ops(hunk["old"], hunk["new"])
+        hunks.append(hunk)
+    return hunks
+
+
+def diff_key(old_document, new_document):
+    return {"old_digest": file_digest(old_document.file), "new_digest": file_digest(new_document.file)}
+
+
+def cached_diff(old_document, new_document):
+    return DocumentDiff.objects.filter(**diff_key(old_document, new_document)).first()
+
+
+def get_diff(old_document, new_document):
+    # Extracts both files unless their text is known, so it runs in the
+    # diff.compute job rather than in a request.
+    key = diff_key(old_document, new_document)
+    diff = DocumentDiff.objects.filter(**key).first()
+    if diff is None:
+        hunks = compute_hunks(
+            DocumentText.objects.for_file(old_document.file).paragraph_list(),
+            DocumentText.objects.for_file(new_document.file).paragraph_list(),
+        )
+        diff, _ = DocumentDiff.objects.get_or_create(**key, defaults={"hunks": hunks})
+    return diff
@@ -0,0 +1,190 @@
+import codecs
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Prefetch
+
+from .files import CHUNK_SIZE
+from .models import Evaluation, LanguageCheck, PlagiarismCheck, Project
+
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+COLUMNS = (
+    "Project", "Student", "Student name", "Supervisor", "Status", "Reviewers",
+    "Evaluations", "Mean evaluation", "Language checks", "Plagiarism checks",
+)
+
+# Characters that are not allowed anywhere in an XML document.
+INVALID_XML_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+def export_projects():
+    # Each chunk of projects costs one query per prefetch, so the query count
+    # grows with the number of chunks and memory stays at one chunk.
+    return Project.objects.select_related("student", "supervisor").prefetch_related(
+        "reviewers",
+        Prefetch("evaluation_set", queryset=Evaluation.objects.select_related("user").order_by("pk")),
+        Prefetch("languagecheck_set", queryset=LanguageCheck.objects.select_related("user").order_by("pk")),
+        Prefetch("plagiarismcheck_set", queryset=PlagiarismCheck.objects.order_by("pk")),
+    ).order_by("pk").iterator(chunk_size=getattr(settings, "EGRADU_EXPORT_CHUNK_SIZE", 2000))
+
+
+def plagiarism_outcome(check):
+    if check.approved is None:
+        return "pending"
+    return "approved" if check.approved else "rejected"
+
+
+def project_row(project):
+    evaluations = list(project.evaluation_set.all())
+    grades = [int(evaluation.grade) for evaluation in evaluations]
+    return [
+        project.pk,
+        project.student.username,
+        project.student.get_full_name(),
+        project.supervisor.username,
+        str(project.status.label),
+        "; ".join(sorted(reviewer.username for reviewer in project.reviewers.all())),
+        "; ".join(f"{evaluation.user.username}: {int(evaluation.grade)}" for evaluation in evaluations),
+        round(sum(grades) / len(grades), 2) if grades else None,
+        "; ".join(f"{check.user.username}: {int(check.grade)}" for check in project.languagecheck_set.all()),
+        "; ".join(plagiarism_outcome(check) for check in project.plagiarismcheck_set.all()),
+    ]
+
+
+def rows():
+    yield list(COLUMNS)
+    for project in export_projects():
+        yield project_row(project)
+
+
+class Output:
+    # Write-only file object that collects what csv or zipfile write into it
+    # until the next chunk is taken. Without seek() zipfile streams entries.
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        self.parts.append(data)
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(part if isinstance(part, bytes) else part.encode() for part in self.parts)
+        self.parts, self.size = [], 0
+        return data
+
+
+def csv_cell(value):
+    if value is None:
+        return ""
+    # Keep spreadsheet programs from evaluating names that look like formulas.
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+
+def csv_chunks(rows):
+    output = Output()
+    # The BOM makes Excel read the file as UTF-8.
+    output.write(codecs.BOM_UTF8)
+    writer = csv.writer(output)
+    for row in rows:
+        writer.writerow([csv_cell(value) for value in row])
+        if output.size >= CHUNK_SIZE:
+            yield output.take()
+    yield output.take()
+
+
+XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Projects" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = "</sheetData></worksheet>"
+
+
+def xlsx_cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value}</v></c>"
+    # Inline strings avoid a shared string table, which would have to be
+    # held in memory until the end of the sheet.
+    text = escape(INVALID_XML_RE.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def xlsx_chunks(rows):
+    output = Output()
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(SHEET_START.encode())
+            for row in rows:
+                sheet.write(f"<row>{''.join(xlsx_cell(value) for value in row)}</row>".encode())
+                if output.size >= CHUNK_SIZE:
+                    yield output.take()
+            sheet.write(SHEET_END.encode())
+    yield output.take()
+
+
+def export(format):
+    return {"csv": csv_chunks, "xlsx": xlsx_chunks}[format](rows())
+
+
+async def aiterate(chunks):
+    # Under ASGI Django reads a sync iterator into memory before sending it.
+    # Pulling one chunk at a time through sync_to_async keeps the export
+    # streaming, and the database cursor on the one sync thread.
+    while chunk := await sync_to_async(next)(chunks, b""):
+        yield chunk
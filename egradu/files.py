@@ -0,0 +1,146 @@
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def file_etag(field_file, size, last_modified):
+    stamp = last_modified.timestamp() if last_modified else ""
+    return quote_etag(hashlib.md5(f"{field_file.name}:{size}:{stamp}".encode()).hexdigest())
+
+
+def parse_range(header, size):
+    # Only single byte ranges are supported, anything else is served in full.
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if if_range.startswith(("\"", "W/")):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and last_modified is not None and int(last_modified.timestamp()) <= since
+
+
+def iter_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+async def aiter_range(file, start, length):
+    # Reads run in worker threads so a slow client only holds a coroutine.
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        await sync_to_async(file.seek, thread_sensitive=False)(start)
+        while length > 0:
+            chunk = await read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
+
+
+def sendfile_response(field_file):
+    backend = getattr(settings, "EGRADU_SENDFILE", None)
+    if backend == "x-accel-redirect":
+        response = HttpResponse()
+        response["X-Accel-Redirect"] = settings.EGRADU_SENDFILE_URL + quote(field_file.name)
+        return response
+    if backend == "x-sendfile":
+        response = HttpResponse()
+        response["X-Sendfile"] = field_file.path
+        return response
+    return None
+
+
+def serve_file(request, field_file, last_modified=None, as_attachment=True, asynchronous=False):
+    size = field_file.size
+    filename = os.path.basename(field_file.name)
+    etag = file_etag(field_file, size, last_modified)
+
+    conditional = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if conditional is not None:
+        return conditional
+
+    # The front proxy handles ranges itself once the file is handed off.
+    response = sendfile_response(field_file)
+    if response is None:
+        byte_range = None
+        if "Range" in request.headers and range_applies(request, etag, last_modified):
+            byte_range = parse_range(request.headers["Range"], size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+        if byte_range:
+            start, end = byte_range
+            iterate = aiter_range if asynchronous else iter_range
+            response = StreamingHttpResponse(
+                iterate(field_file.open("rb"), start, end - start + 1), status=206
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response["Content-Length"] = end - start + 1
+        elif asynchronous:
+            response = StreamingHttpResponse(aiter_range(field_file.open("rb"), 0, size))
+            response["Content-Length"] = size
+        else:
+            response = FileResponse(field_file.open("rb"))
+            response.block_size = CHUNK_SIZE
+            response["Content-Length"] = size
+
+    content_type, _ = mimetypes.guess_type(filename)
+    response["Content-Type"] = content_type or "application/octet-stream"
+    disposition = "attachment" if as_attachment else "inline"
+    response["Content-Disposition"] = f"{disposition}; filename*=utf-8''{quote(filename)}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
+
+
+async def aserve_file(request, field_file, **kwargs):
+    # Under ASGI Django reads a sync iterator into memory before sending it,
+    # so files are streamed with an async iterator there. WSGI keeps the
+    # FileResponse and the server's file wrapper.
+    return await sync_to_async(serve_file)(
+        request, field_file, asynchronous=isinstance(request, ASGIRequest), **kwargs
+    )
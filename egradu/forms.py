@@ -1,5 +1,7 @@
 from django import forms
-from .models import Document, Project, DocumentComments, Evaluation, PlagiarismCheck
+from django.conf import settings
+from django.db import transaction
+from .models import Document, Project, DocumentComments, Evaluation, PlagiarismCheck, UploadSession
 from django.utils.timezone import now
 
 
@@ -74,24 +76,73 @@ class PlagiarismCheckForm(forms.ModelForm):
 
 
 class UploadDocumentForm(forms.ModelForm):
+    # Large files can be sent beforehand through the chunked upload API, in
+    # which case only the id of the committed UploadSession is posted here.
+    file_upload = forms.UUIDField(required=False, widget=forms.HiddenInput)
+    abstract_upload = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Document
         fields = ("file", "abstract")
 
-    def __init__(self, project, *args, **kwargs):
+    def __init__(self, project, user, *args, **kwargs):
         self.project = project
+        self.user = user
+        self.uploads = {}
         super().__init__(*args, **kwargs)
+        self.fields["file"].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field in ("file", "abstract"):
+            session_id = cleaned_data.get(f"{field}_upload")
+            if not session_id:
+                continue
+            session = UploadSession.objects.filter(pk=session_id, user=self.user).exclude(stored_name="").first()
+            if session is None:
+                self.add_error(f"{field}_upload", "Unknown or unfinished upload")
+            else:
+                self.uploads[field] = session
+
+        if not cleaned_data.get("file") and "file" not in self.uploads:
+            self.add_error("file", forms.Field.default_error_messages["required"])
+        return cleaned_data
 
     def save(self, commit=True):
         instance = super().save(commit=False)
         instance.project = self.project
         instance.latest_update = now()
+        for field, session in self.uploads.items():
+            setattr(instance, field, session.stored_name)
         if commit:
-            instance.save()
+            with transaction.atomic():
+                # Locking the project keeps latest_document pointing at the
+                # newest of two concurrent uploads.
+                project = Project.objects.select_for_update().get(pk=self.project.pk)
+                instance.save()
+                project.latest_document = instance
+                project.document_count += 1
+                project.save(update_fields=["latest_document", "document_count"])
+                # The committed blob reference now belongs to the document.
+                UploadSession.objects.filter(pk__in=[session.pk for session in self.uploads.values()]).delete()
+            self.project.latest_document = instance
+            self.project.document_count = project.document_count
 
         return instance
 
 
+class UploadSessionForm(forms.ModelForm):
+    class Meta:
+        model = UploadSession
+        fields = ("filename", "size", "sha256")
+
+    def clean_size(self):
+        size = self.cleaned_data["size"]
+        if size <= 0 or size > settings.EGRADU_UPLOAD_MAX_SIZE:
+            raise forms.ValidationError(f"Size must be between 1 and {settings.EGRADU_UPLOAD_MAX_SIZE} bytes")
+        return size
+
+
 class ProjectForm(forms.ModelForm):
     class Meta:
         model = Project
@@ -109,3 +160,8 @@ class ProjectForm(forms.ModelForm):
             instance.save()
 
         return instance
+
+
+class CohortImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or JSON with username, email, first_name, last_name, roles and supervisor.")
+    dry_run = forms.BooleanField(required=False, initial=True)
@@ -0,0 +1,69 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import get_language
+
+
+# Sections of the teacher dashboard, cached per user. Every section has a
+# version token and the rendered HTML is stored under the current token, so
+# invalidating a section is a single write and stale fragments just expire.
+REVIEWS = "reviews"
+PLAGIARISM = "plagiarism"
+DRAFTS = "drafts"
+PROJECTS = "projects"
+SUPERVISOR_SECTIONS = (PLAGIARISM, DRAFTS, PROJECTS)
+
+
+def version_key(user_id, section):
+    return f"egradu:fragment:{user_id}:{section}"
+
+
+def fragment_key(user_id, section, version):
+    return f"egradu:fragment:{user_id}:{section}:{get_language()}:{version}"
+
+
+async def aversions(user_id, sections):
+    keys = {section: version_key(user_id, section) for section in sections}
+    found = await cache.aget_many(keys.values())
+    versions = {}
+    for section, key in keys.items():
+        if key not in found:
+            # A section that was never invalidated, or whose token got evicted,
+            # starts from a new token so older fragments are never reused.
+            await cache.aadd(key, uuid4().hex, None)
+            found[key] = await cache.aget(key)
+        versions[section] = found[key]
+    return versions
+
+
+async def arender_sections(user_id, renderers):
+    # renderers maps section names to coroutine functions returning the HTML,
+    # which only run for sections missing from the cache.
+    versions = await aversions(user_id, renderers)
+    keys = {section: fragment_key(user_id, section, version) for section, version in versions.items()}
+    cached = await cache.aget_many(keys.values())
+
+    sections, fresh = {}, {}
+    for section, render in renderers.items():
+        key = keys[section]
+        if key not in cached:
+            fresh[key] = cached[key] = await render()
+        sections[section] = cached[key]
+    if fresh:
+        await cache.aset_many(fresh, getattr(settings, "EGRADU_FRAGMENT_CACHE_TIMEOUT", 3600))
+    return sections
+
+
+def invalidate_sections(user_ids, *sections):
+    # Deferred until commit, otherwise a dashboard loaded in the meantime
+    # would cache the rows as they were before this transaction under the new
+    # token.
+    tokens = {
+        version_key(user_id, section): uuid4().hex
+        for user_id in set(user_ids) if user_id is not None
+        for section in sections
+    }
+    if tokens:
+        transaction.on_commit(lambda: cache.set_many(tokens, None))
@@ -0,0 +1,98 @@
+from datetime import datetime, time, timedelta
+from statistics import median
+
+from django.db.models import Max, Q
+from django.utils.timezone import localdate, make_aware, now
+
+from .models import StatusDay, StatusTransition
+
+
+def record(changes):
+    # changes are (project_id, supervisor_id, from_status, to_status) tuples
+    # of status changes made in the current transaction.
+    if not changes:
+        return []
+    current = now()
+    entered = dict(
+        StatusTransition.objects.filter(project__in=[change[0] for change in changes])
+        .values("project").annotate(last=Max("time")).values_list("project", "last")
+    )
+    transitions = StatusTransition.objects.bulk_create([
+        StatusTransition(
+            project_id=project_id, supervisor_id=supervisor_id,
+            from_status=from_status, to_status=to_status, time=current,
+            duration=current - entered[project_id] if project_id in entered else None,
+        )
+        for project_id, supervisor_id, from_status, to_status in changes
+    ])
+
+    day = localdate(current)
+    buckets = set()
+    for transition in transitions:
+        for status in (transition.from_status, transition.to_status):
+            if status is not None:
+                buckets.update([(status, transition.supervisor_id), (status, None)])
+    # A fixed order keeps concurrent transactions from locking the rollup rows
+    # in opposite orders.
+    for status, supervisor_id in sorted(buckets, key=lambda bucket: (bucket[0], bucket[1] or 0)):
+        refresh_day(day, status, supervisor_id)
+    return transitions
+
+
+def refresh_day(day, status, supervisor_id=None):
+    # Recomputes one rollup row from that day's transitions, which are few, so
+    # the median stays exact. The row lock makes concurrent refreshes of the
+    # same row wait and then see each other's transitions.
+    row, _ = StatusDay.objects.select_for_update().get_or_create(
+        day=day, status=status, supervisor_id=supervisor_id,
+    )
+    start = make_aware(datetime.combine(day, time.min))
+    end = make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    transitions = StatusTransition.objects.filter(
+        Q(from_status=status) | Q(to_status=status), time__gte=start, time__lt=end,
+    )
+    if supervisor_id is not None:
+        transitions = transitions.filter(supervisor_id=supervisor_id)
+
+    entered, left, durations = 0, 0, []
+    for to_status, duration in transitions.values_list("to_status", "duration"):
+        if to_status == status:
+            entered += 1
+        else:
+            left += 1
+            if duration is not None:
+                durations.append(duration)
+    row.entered = entered
+    row.left = left
+    row.median_duration = median(durations) if durations else None
+    row.save(update_fields=["entered", "left", "median_duration"])
+    return row
+
+
+def combined_median(days):
+    # Daily medians weighted by how many projects left the status that day.
+    # Exact for a single day and close enough to rank statuses over longer
+    # windows without reading the transitions again.
+    weighted = sorted((day.median_duration, day.left) for day in days if day.median_duration is not None)
+    half = sum(left for _, left in weighted) / 2
+    seen = 0
+    for duration, left in weighted:
+        seen += left
+        if seen >= half:
+            return duration
+    return None
+
+
+def summarize(days):
+    # Folds StatusDay rows into one entry per (status, supervisor_id).
+    grouped = {}
+    for day in days:
+        grouped.setdefault((day.status, day.supervisor_id), []).append(day)
+    return {
+        key: {
+            "entered": sum(day.entered for day in rows),
+            "left": sum(day.left for day in rows),
+            "median": combined_median(rows),
+        }
+        for key, rows in grouped.items()
+    }
@@ -0,0 +1,110 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .models import Job, JobStatus
+
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+def job(name, on_claim=None):
+    # on_claim runs in the same transaction that marks the job as running, so
+    # status changes that mean "work has started" are never visible before a
+    # worker actually has the job.
+    def register(func):
+        func.job_name = name
+        func.on_claim = on_claim
+        registry[name] = func
+        return func
+    return register
+
+
+def enqueue(name, user=None, unique=False, **payload):
+    if name not in registry:
+        raise KeyError(f"Unknown job {name!r}")
+    if unique:
+        existing = Job.objects.filter(
+            name=name, payload=payload, status__in=(JobStatus.QUEUED, JobStatus.RUNNING)
+        ).first()
+        if existing:
+            return existing
+    return Job.objects.create(name=name, payload=payload, user=user)
+
+
+def requeue_stale():
+    # A worker that died mid-job leaves it RUNNING, and unique enqueues would
+    # keep returning it. Once its lease is over it counts as a failed attempt.
+    lease = getattr(settings, "EGRADU_JOB_LEASE", 900)
+    stale = Job.objects.filter(status=JobStatus.RUNNING, started__lt=now() - timedelta(seconds=lease))
+    error = f"Not finished within the {lease} second lease, the worker probably stopped"
+    stale.filter(attempts__lt=F("max_attempts")).update(status=JobStatus.QUEUED, run_after=now(), error=error)
+    stale.update(status=JobStatus.FAILED, finished=now(), error=error)
+
+
+def claim():
+    requeue_stale()
+    candidates = Job.objects.filter(
+        status=JobStatus.QUEUED, run_after__lte=now()
+    ).order_by("run_after", "pk").values_list("pk", flat=True)[:20]
+
+    for pk in candidates:
+        with transaction.atomic():
+            # Only the worker whose conditional UPDATE matches gets the job,
+            # which works the same on every database backend.
+            claimed = Job.objects.filter(pk=pk, status=JobStatus.QUEUED).update(
+                status=JobStatus.RUNNING, started=now(), attempts=F("attempts") + 1
+            )
+            if not claimed:
+                continue
+            job = Job.objects.get(pk=pk)
+            handler = registry.get(job.name)
+            try:
+                with transaction.atomic():
+                    if handler is None:
+                        raise KeyError(f"Unknown job {job.name!r}")
+                    if handler.on_claim:
+                        handler.on_claim(**job.payload)
+            except Exception:
+                fail(job, traceback.format_exc())
+                continue
+        return job
+    return None
+
+
+def perform(job):
+    try:
+        with transaction.atomic():
+            registry[job.name](**job.payload)
+    except Exception:
+        logger.exception("Job %s (%s) failed", job.pk, job.name)
+        fail(job, traceback.format_exc())
+        return False
+
+    Job.objects.filter(pk=job.pk).update(status=JobStatus.DONE, finished=now(), error="")
+    return True
+
+
+def fail(job, error):
+    if job.attempts < job.max_attempts:
+        delay = getattr(settings, "EGRADU_JOB_RETRY_DELAY", 30) * 2 ** (job.attempts - 1)
+        Job.objects.filter(pk=job.pk).update(
+            status=JobStatus.QUEUED, run_after=now() + timedelta(seconds=delay), error=error
+        )
+    else:
+        Job.objects.filter(pk=job.pk).update(status=JobStatus.FAILED, finished=now(), error=error)
+
+
+def run_next():
+    job = claim()
+    if job is None:
+        return None
+    perform(job)
+    return job
@@ -0,0 +1,261 @@
+import io
+import zipfile
+from dataclasses import dataclass, field
+from typing import Callable
+from xml.sax.saxutils import escape
+
+from django.urls import reverse
+
+from .models import Document, DocumentComments, DocumentPreview, DocumentStatus, Job, Project, UploadSession
+from .storage import ContentAddressedStorage
+
+
+WORDS = (
+    "analysis", "approach", "argument", "assessment", "case", "concept", "context", "data",
+    "design", "development", "effect", "evidence", "factor", "framework", "function", "impact",
+    "interpretation", "method", "model", "observation", "outcome", "perspective", "policy",
+    "principle", "process", "research", "response", "result", "sample", "significance",
+    "source", "structure", "study", "survey", "theory", "variable", "the", "of", "and", "in",
+    "this", "that", "is", "was", "with", "which", "results", "suggest", "previous", "findings",
+    "indicate", "further", "across", "between", "within", "students", "thesis", "university",
+)
+
+ODT_MIMETYPE = "application/vnd.oasis.opendocument.text"
+ODT_MANIFEST = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0">'
+    f'<manifest:file-entry manifest:full-path="/" manifest:media-type="{ODT_MIMETYPE}"/>'
+    '<manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>'
+    "</manifest:manifest>"
+)
+ODT_CONTENT = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+    'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0" office:version="1.2">'
+    "<office:body><office:text>{}</office:text></office:body></office:document-content>"
+)
+
+
+def sentence(rng, words=14):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def make_paragraphs(rng, count, sentences=4):
+    return [" ".join(sentence(rng) for _ in range(sentences)) for _ in range(count)]
+
+
+def revise(rng, paragraphs, changes=3):
+    # A new version rewrites, inserts or drops a few paragraphs, which is
+    # roughly what happens between two uploads of a thesis.
+    paragraphs = list(paragraphs)
+    for _ in range(changes):
+        position = rng.randrange(len(paragraphs) + 1)
+        action = rng.choice(("rewrite", "insert", "drop"))
+        if action == "insert" or not paragraphs:
+            paragraphs.insert(position, " ".join(sentence(rng) for _ in range(4)))
+        elif action == "rewrite":
+            paragraphs[min(position, len(paragraphs) - 1)] = " ".join(sentence(rng) for _ in range(4))
+        elif len(paragraphs) > 1:
+            del paragraphs[min(position, len(paragraphs) - 1)]
+    return paragraphs
+
+
+def odt_bytes(paragraphs):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        # The mimetype entry has to come first and be stored uncompressed.
+        archive.writestr("mimetype", ODT_MIMETYPE, compress_type=zipfile.ZIP_STORED)
+        archive.writestr("META-INF/manifest.xml", ODT_MANIFEST)
+        archive.writestr(
+            "content.xml",
+            ODT_CONTENT.format("".join(f"<text:p>{escape(paragraph)}</text:p>" for paragraph in paragraphs)),
+        )
+    return buffer.getvalue()
+
+
+def username(prefix, role, index):
+    return f"{prefix}-{role}-{index}"
+
+
+@dataclass(frozen=True)
+class Request:
+    method: str
+    path: str
+    data: dict = field(default_factory=dict)
+    headers: dict = field(default_factory=dict)
+    body: bytes = None
+
+
+@dataclass(frozen=True)
+class Scenario:
+    # build gets a random.Random and the acting user and returns the Request
+    # to time, or None when that user has nothing to act on.
+    url_name: str
+    role: str
+    build: Callable
+    method: str = "GET"
+    writes: bool = False
+    fresh_session: bool = False
+
+    @property
+    def label(self):
+        return f"{self.method} {self.url_name} [{self.role}]"
+
+
+def pick(rng, queryset):
+    pks = list(queryset.values_list("pk", flat=True)[:200])
+    return rng.choice(pks) if pks else None
+
+
+def get(url_name, *args, **query):
+    path = reverse(url_name, args=args)
+    if query:
+        path += "?" + "&".join(f"{key}={value}" for key, value in query.items())
+    return Request("GET", path)
+
+
+def own_document(rng, user, **filters):
+    return pick(rng, Document.objects.filter(project__student=user, **filters))
+
+
+def supervised_document(rng, user, **filters):
+    return pick(rng, Document.objects.filter(project__supervisor=user, **filters))
+
+
+def supervised_project(rng, user, **filters):
+    return pick(rng, Project.objects.filter(supervisor=user, **filters))
+
+
+def rendered_document(rng, user):
+    # Previews belong to file contents, not documents, see egradu.previews.
+    rendered = set(DocumentPreview.objects.exclude(pdf="").values_list("digest", flat=True))
+    documents = Document.objects.filter(project__student=user).values_list("pk", "file")
+    pks = [pk for pk, name in documents if ContentAddressedStorage.digest(name) in rendered]
+    return rng.choice(pks) if pks else None
+
+
+def latest_with_previous(rng, user):
+    project = Project.objects.filter(student=user, document_count__gt=1).first()
+    return get("document_changes", project.latest_document_id) if project else None
+
+
+def upload_document(rng, user):
+    content = odt_bytes(make_paragraphs(rng, 40))
+    return Request("POST", reverse("upload_document"), {"file": ("thesis.odt", content)})
+
+
+def comment(rng, user):
+    document = supervised_document(rng, user)
+    if document is None:
+        return None
+    return Request("POST", reverse("document", args=[document]), {"comment": sentence(rng)})
+
+
+def start_lang_check(rng, user):
+    document = own_document(rng, user, project__status=DocumentStatus.DRAFT)
+    return get("start_lang_check", document) if document else None
+
+
+def start_review(rng, user):
+    project = Project.objects.filter(student=user, status=DocumentStatus.LANGUAGE_CHECK).first()
+    return get("start_review", project.pk) if project else None
+
+
+def start_plagiarism(rng, user):
+    project = supervised_project(rng, user, status=DocumentStatus.PENDING_PLAGIARISM, document__isnull=False)
+    return get("start_plagiarism", project) if project else None
+
+
+def upload_session(rng, user, size=64 * 1024):
+    return UploadSession.objects.create(user=user, filename="thesis.odt", size=size)
+
+
+def append_to_session(rng, user):
+    session = upload_session(rng, user)
+    return Request(
+        "PATCH", reverse("upload_session", args=[session.pk]),
+        headers={"Upload-Offset": "0"}, body=rng.randbytes(session.size),
+    )
+
+
+def commit_session(rng, user):
+    from .uploads import append_chunk
+
+    session = upload_session(rng, user)
+    append_chunk(session, 0, io.BytesIO(rng.randbytes(session.size)))
+    return Request("POST", reverse("upload_session_commit", args=[session.pk]))
+
+
+def optional(url_name, target, *args):
+    return get(url_name, target, *args) if target else None
+
+
+SCENARIOS = (
+    Scenario("login", "anonymous", lambda rng, user: get("login")),
+    Scenario("logout", "student", lambda rng, user: Request("POST", reverse("logout")), "POST", fresh_session=True),
+    Scenario("index", "student", lambda rng, user: get("index")),
+    Scenario("index", "supervisor", lambda rng, user: get("index")),
+    Scenario("student_index", "student", lambda rng, user: get("student_index")),
+    Scenario("project_create", "student", lambda rng, user: get("project_create")),
+    Scenario("upload_document", "student", lambda rng, user: get("upload_document")),
+    Scenario("upload_document", "student", upload_document, "POST", writes=True),
+    Scenario("document", "supervisor", lambda rng, user: optional("document", supervised_document(rng, user))),
+    Scenario("document", "supervisor", comment, "POST", writes=True),
+    Scenario(
+        "document_download", "student",
+        lambda rng, user: optional("document_download", own_document(rng, user)),
+    ),
+    Scenario(
+        "abstract_download", "student",
+        lambda rng, user: optional("abstract_download", own_document(rng, user, abstract__gt="")),
+    ),
+    Scenario(
+        "document_comments", "supervisor",
+        lambda rng, user: optional("document_comments", supervised_document(rng, user)),
+    ),
+    Scenario("document_preview", "student", lambda rng, user: optional("document_preview", rendered_document(rng, user))),
+    Scenario(
+        "document_preview_page", "student",
+        lambda rng, user: optional("document_preview_page", rendered_document(rng, user), 1),
+    ),
+    Scenario("document_changes", "student", latest_with_previous),
+    Scenario(
+        "comment_download", "supervisor",
+        lambda rng, user: optional("comment_download", pick(rng, DocumentComments.objects.filter(
+            user=user, commented_document__gt="",
+        ))),
+    ),
+    Scenario("start_lang_check", "student", start_lang_check, writes=True),
+    Scenario("teacher_index", "supervisor", lambda rng, user: get("teacher_index")),
+    Scenario("teacher_drafts", "supervisor", lambda rng, user: get("teacher_drafts")),
+    Scenario("teacher_projects", "supervisor", lambda rng, user: get("teacher_projects")),
+    Scenario("project", "supervisor", lambda rng, user: optional("project", supervised_project(
+        rng, user, document__isnull=False,
+    ))),
+    Scenario("project_versions", "student", lambda rng, user: optional("project_versions", pick(
+        rng, Project.objects.filter(student=user, document_count__gt=1),
+    ))),
+    Scenario("review", "reviewer", lambda rng, user: optional("review", pick(rng, Project.objects.filter(
+        reviewers=user, status=DocumentStatus.EVALUATION,
+    )))),
+    Scenario("start_plagiarism", "supervisor", start_plagiarism, writes=True),
+    Scenario("start_review", "student", start_review, writes=True),
+    Scenario("import_plagiarism", "supervisor", lambda rng, user: optional("import_plagiarism", supervised_project(
+        rng, user, status=DocumentStatus.PLAGIARISM_ONGOING,
+    ))),
+    Scenario("job_status", "supervisor", lambda rng, user: optional("job_status", pick(rng, Job.objects.filter(user=user)))),
+    Scenario("metrics", "staff", lambda rng, user: get("metrics")),
+    Scenario("search", "supervisor", lambda rng, user: get("search", q=rng.choice(WORDS[:36]))),
+    Scenario(
+        "upload_sessions", "student",
+        lambda rng, user: Request("POST", reverse("upload_sessions"), {"filename": "thesis.odt", "size": 1024}),
+        "POST", writes=True,
+    ),
+    Scenario(
+        "upload_session", "student",
+        lambda rng, user: get("upload_session", upload_session(rng, user).pk), writes=True,
+    ),
+    Scenario("upload_session", "student", append_to_session, "PATCH", writes=True),
+    Scenario("upload_session_commit", "student", commit_session, "POST", writes=True),
+)
@@ -0,0 +1,67 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.timezone import now
+
+from egradu.models import Document, LastDocumentVisit, Project
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the unread-state dashboard query while the number of read "
+        "cursors per document grows. All generated rows are rolled back when "
+        "the command finishes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--documents", type=int, default=50)
+        parser.add_argument("--readers", type=int, nargs="+", default=[1, 10, 100, 1000])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options["documents"], options["readers"], options["repeat"])
+            transaction.set_rollback(True)
+
+    def run(self, document_count, reader_counts, repeat):
+        student = User.objects.create(username="benchmark-student")
+        supervisor = User.objects.create(username="benchmark-supervisor")
+        project = Project.objects.create(student=student, supervisor=supervisor)
+        documents = Document.objects.bulk_create(
+            Document(project=project, file="benchmark.odt", latest_update=now())
+            for _ in range(document_count)
+        )
+
+        LastDocumentVisit.objects.bulk_create(
+            LastDocumentVisit(document=document, user=supervisor) for document in documents
+        )
+
+        self.stdout.write("readers/document  total cursors  ms/query")
+        readers = [supervisor]
+        for count in sorted(reader_counts):
+            new_readers = User.objects.bulk_create(
+                User(username=f"benchmark-reader-{i}") for i in range(len(readers), count)
+            )
+            LastDocumentVisit.objects.bulk_create(
+                (
+                    LastDocumentVisit(document=document, user=reader)
+                    for reader in new_readers
+                    for document in documents
+                ),
+                batch_size=5000,
+            )
+            readers.extend(new_readers)
+
+            queryset = Document.objects.filter(project=project).with_read_state(supervisor)
+            began = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.values_list("id", "update"))
+            elapsed = (time.perf_counter() - began) / repeat * 1000
+            self.stdout.write(
+                f"{len(readers):>16}  {len(readers) * document_count:>13}  {elapsed:>8.2f}"
+            )
@@ -0,0 +1,259 @@
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request as UrlRequest, build_opener
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries, transaction
+from django.db.models import Max
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+
+from egradu import urls
+from egradu.loadtest import SCENARIOS
+from egradu.models import Blob, UploadSession
+from egradu.storage import document_storage
+from egradu.uploads import part_path
+
+
+User = get_user_model()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, round(fraction * (len(values) - 1)))]
+
+
+class NoRedirect(HTTPRedirectHandler):
+    # Only the request itself is timed, redirects are reported as 302.
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == "csrftoken"), "")
+
+    def login(self, username, password):
+        self.open("GET", reverse("login"))
+        status, _ = self.open("POST", reverse("login"), {
+            "username": username, "password": password, "csrfmiddlewaretoken": self.csrf_token(),
+        })
+        if status != 302:
+            raise CommandError(f"Could not log in as {username}, run seed_load with the same --password")
+
+    def open(self, method, path, data=None, headers=None, body=None):
+        headers = {"X-CSRFToken": self.csrf_token(), "Referer": self.base_url + "/", **(headers or {})}
+        if body is None and data:
+            if any(isinstance(value, tuple) for value in data.values()):
+                body, headers["Content-Type"] = self.multipart(data)
+            else:
+                body = urlencode(data).encode()
+                headers["Content-Type"] = "application/x-www-form-urlencoded"
+        request = UrlRequest(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(request) as response:
+                return response.status, response.read()
+        except HTTPError as error:
+            return error.code, error.read()
+
+    @staticmethod
+    def multipart(data):
+        boundary = uuid.uuid4().hex
+        parts = []
+        for name, value in data.items():
+            if isinstance(value, tuple):
+                filename, content = value
+                head = f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n' \
+                       "Content-Type: application/octet-stream\r\n\r\n"
+            else:
+                head = f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                content = str(value).encode()
+            parts.append(f"--{boundary}\r\n{head}".encode() + content + b"\r\n")
+        parts.append(f"--{boundary}--\r\n".encode())
+        return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every URL in egradu/urls.py as the users created by seed_load "
+        "and report p50/p95 latency and database queries per request. "
+        "Requests run in-process through the test client and everything they "
+        "write is rolled back. With --base-url they are sent over HTTP to a "
+        "running server instead, which gives latency under concurrency but no "
+        "query counts, and --writes then changes the data for real."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20, help="Requests per scenario.")
+        parser.add_argument("--prefix", default="load")
+        parser.add_argument("--password", default="load")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--writes", action="store_true", help="Include uploads, comments and status changes.")
+        parser.add_argument("--only", nargs="+", default=[], help="Run scenarios whose label contains any of these.")
+        parser.add_argument("--host", default="localhost", help="Host header for in-process requests.")
+        parser.add_argument("--base-url", help="Send requests over HTTP, e.g. http://localhost:8000.")
+        parser.add_argument("--concurrency", type=int, default=1, help="Parallel requests with --base-url.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options["seed"])
+        self.users = {
+            role: list(User.objects.filter(username__startswith=f"{options['prefix']}-{role}-").order_by("pk"))
+            for role in ("student", "supervisor", "reviewer", "staff")
+        }
+        if not all(self.users.values()):
+            raise CommandError(f"No seeded users with prefix {options['prefix']!r}, run seed_load first")
+
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if (options["writes"] or not scenario.writes)
+            and (not options["only"] or any(part in scenario.label for part in options["only"]))
+        ]
+
+        self.stdout.write(f"{'scenario':<44} {'n':>4} {'skip':>4} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'queries':>7}  status")
+        if options["base_url"]:
+            for scenario in scenarios:
+                self.report(scenario, *self.run_http(scenario))
+        else:
+            started = now()
+            last_blob = Blob.objects.aggregate(last=Max("pk"))["last"] or 0
+            with transaction.atomic():
+                for scenario in scenarios:
+                    self.report(scenario, *self.run_local(scenario))
+                # The files the scenarios stored outlive their rolled back rows.
+                blobs = list(Blob.objects.filter(pk__gt=last_blob).values_list("name", flat=True))
+                sessions = list(UploadSession.objects.filter(created__gte=started))
+                transaction.set_rollback(True)
+            self.remove_files(blobs, sessions)
+
+        covered = {scenario.url_name for scenario in scenarios}
+        missing = sorted({pattern.name for pattern in urls.urlpatterns} - covered)
+        if missing:
+            self.stdout.write(f"Not covered: {', '.join(missing)}")
+
+    def remove_files(self, blobs, sessions):
+        storage = document_storage()
+        for name in blobs:
+            # No Blob row is left, so the file itself is deleted.
+            storage.delete(name)
+            directory = os.path.dirname(storage.path(name))
+            for _ in range(2):
+                # <digest>/ and <digest[:2]>/, if nothing else is stored there.
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+        for session in sessions:
+            try:
+                os.unlink(part_path(session))
+            except FileNotFoundError:
+                pass
+
+    def user_for(self, scenario):
+        if scenario.role == "anonymous":
+            return None
+        return self.rng.choice(self.users[scenario.role])
+
+    def build(self, scenario, attempts=20):
+        # Most scenarios need a project in a particular status, so a few
+        # users are tried before the request counts as skipped.
+        for _ in range(attempts):
+            user = self.user_for(scenario)
+            request = scenario.build(self.rng, user)
+            if request is not None:
+                break
+        return user, request
+
+    def run_local(self, scenario):
+        clients = {}
+        timings, queries, statuses, skipped = [], [], Counter(), 0
+        for _ in range(self.options["requests"]):
+            user, request = self.build(scenario)
+            if request is None:
+                skipped += 1
+                continue
+            client = clients.get(user) if not scenario.fresh_session else None
+            if client is None:
+                client = clients[user] = Client(HTTP_HOST=self.options["host"])
+                if user is not None:
+                    client.force_login(user)
+
+            # The query log is capped, so it is emptied before every request.
+            reset_queries()
+            with CaptureQueriesContext(connection) as captured:
+                began = time.perf_counter()
+                response = self.send_local(client, request)
+                if response.streaming:
+                    for _ in response.streaming_content:
+                        pass
+                timings.append((time.perf_counter() - began) * 1000)
+            queries.append(len(captured))
+            statuses[response.status_code] += 1
+        return timings, queries, statuses, skipped
+
+    def send_local(self, client, request):
+        if request.body is not None:
+            return client.generic(
+                request.method, request.path, request.body,
+                content_type="application/octet-stream", headers=request.headers,
+            )
+        if request.method == "GET":
+            return client.get(request.path, headers=request.headers)
+        data = {
+            name: SimpleUploadedFile(*value) if isinstance(value, tuple) else value
+            for name, value in request.data.items()
+        }
+        return client.post(request.path, data, headers=request.headers)
+
+    def run_http(self, scenario):
+        sessions = {}
+        jobs, skipped = [], 0
+        for _ in range(self.options["requests"]):
+            user, request = self.build(scenario)
+            if request is None:
+                skipped += 1
+                continue
+            session = sessions.get(user) if not scenario.fresh_session else None
+            if session is None:
+                session = sessions[user] = HttpSession(self.options["base_url"])
+                if user is not None:
+                    session.login(user.username, self.options["password"])
+            jobs.append((session, request))
+
+        def send(job):
+            session, request = job
+            began = time.perf_counter()
+            status, _ = session.open(request.method, request.path, request.data, request.headers, request.body)
+            return (time.perf_counter() - began) * 1000, status
+
+        with ThreadPoolExecutor(max_workers=self.options["concurrency"]) as pool:
+            results = list(pool.map(send, jobs))
+        return [timing for timing, _ in results], [], Counter(status for _, status in results), skipped
+
+    def report(self, scenario, timings, queries, statuses, skipped):
+        if not timings:
+            self.stdout.write(f"{scenario.label:<44} {0:>4} {skipped:>4}")
+            return
+        query_count = f"{sum(queries) / len(queries):.1f}" if queries else "-"
+        status = " ".join(f"{code}x{count}" for code, count in sorted(statuses.items()))
+        self.stdout.write(
+            f"{scenario.label:<44} {len(timings):>4} {skipped:>4} {percentile(timings, 0.5):>8.1f} "
+            f"{percentile(timings, 0.95):>8.1f} {max(timings):>8.1f} {query_count:>7}  {status}"
+        )
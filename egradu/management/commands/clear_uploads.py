@@ -0,0 +1,33 @@
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from egradu.models import UploadSession
+from egradu.storage import document_storage
+from egradu.uploads import part_path
+
+
+class Command(BaseCommand):
+    help = "Remove chunked upload sessions that were never attached to a document."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=24)
+
+    def handle(self, *args, **options):
+        storage = document_storage()
+        stale = UploadSession.objects.filter(created__lt=now() - timedelta(hours=options["hours"]))
+        count = 0
+        for session in stale:
+            if session.stored_name:
+                # Drops the reference taken when the upload was committed.
+                storage.delete(session.stored_name)
+            else:
+                try:
+                    os.unlink(part_path(session))
+                except FileNotFoundError:
+                    pass
+            session.delete()
+            count += 1
+        self.stdout.write(f"Removed {count} upload sessions")
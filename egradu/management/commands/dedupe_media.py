@@ -0,0 +1,51 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from egradu.models import Document, DocumentComments
+from egradu.storage import document_storage
+
+
+FILE_FIELDS = (
+    (Document, "file"),
+    (Document, "abstract"),
+    (DocumentComments, "commented_document"),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move files uploaded before content-addressed storage into it so that "
+        "identical uploads are stored once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        storage = document_storage()
+        legacy = set()
+
+        with transaction.atomic():
+            for model, field in FILE_FIELDS:
+                rows = model.objects.exclude(**{f"{field}__isnull": True}).exclude(**{field: ""})
+                for pk, name in rows.values_list("pk", field).iterator():
+                    if storage.digest(name):
+                        continue
+                    if not storage.exists(name):
+                        self.stderr.write(f"{model.__name__} {pk}: {name} is missing, skipped")
+                        continue
+                    with storage.open(name) as content:
+                        new_name = storage.save(os.path.basename(name), content)
+                    model.objects.filter(pk=pk).update(**{field: new_name})
+                    legacy.add(name)
+                    self.stdout.write(f"{name} -> {new_name}")
+
+            if options["dry_run"]:
+                transaction.set_rollback(True)
+
+        if not options["dry_run"]:
+            for name in legacy:
+                storage.delete(name)
+        self.stdout.write(f"{len(legacy)} legacy files {'would be ' if options['dry_run'] else ''}moved")
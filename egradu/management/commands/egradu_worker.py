@@ -0,0 +1,46 @@
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from egradu.jobs import run_next
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=1, help="Number of worker processes.")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument("--burst", action="store_true", help="Exit once the queue is empty.")
+
+    def handle(self, *args, **options):
+        if options["processes"] > 1:
+            return self.run_pool(options)
+
+        while True:
+            job = run_next()
+            if job is not None:
+                self.stdout.write(f"Job {job.pk} ({job.name}) finished")
+                continue
+            if options["burst"]:
+                return
+            time.sleep(options["poll"])
+
+    def run_pool(self, options):
+        # Each worker is a separate manage.py process with its own database
+        # connection. Claims are conditional updates, so workers never share
+        # a job.
+        command = [sys.executable, sys.argv[0], "egradu_worker", "--processes", "1", "--poll", str(options["poll"])]
+        if options["burst"]:
+            command.append("--burst")
+        workers = [subprocess.Popen(command) for _ in range(options["processes"])]
+        try:
+            for worker in workers:
+                worker.wait()
+        except KeyboardInterrupt:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.wait()
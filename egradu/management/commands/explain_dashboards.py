@@ -0,0 +1,125 @@
+import re
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from egradu.models import Project
+
+
+User = get_user_model()
+
+POSTGRES_SCAN_RE = re.compile(r"Seq Scan on (\w+)")
+POSTGRES_SORT_RE = re.compile(r"(?:^|-> +)Sort ")
+SQLITE_SCAN_RE = re.compile(r"^SCAN (\w+)(?! USING (?:COVERING )?INDEX)")
+SQLITE_SORT_RE = re.compile(r"^USE TEMP B-TREE FOR ORDER BY")
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith("SELECT") and not many:
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Request the dashboards as real users, EXPLAIN every SELECT they run "
+        "and report the queries that still scan a whole table or sort without "
+        "an index. Planners scan small tables on purpose, so run this against "
+        "realistic data, for example after seed_load. Nothing the requests "
+        "write is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--strict", action="store_true", help="Fail if any query scans a table.")
+        parser.add_argument("--host", default="localhost", help="Host header for the requests.")
+        parser.add_argument("--verbose-plans", action="store_true", help="Print the full plan of every query.")
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("postgresql", "sqlite"):
+            raise CommandError(f"EXPLAIN output of {connection.vendor} is not supported")
+        self.options = options
+        self.tables = {model._meta.db_table for model in apps.get_models(include_auto_created=True)}
+
+        scans = sorts = 0
+        with transaction.atomic():
+            for label, user, url in self.pages():
+                page_scans, page_sorts = self.check_page(label, user, url)
+                scans += page_scans
+                sorts += page_sorts
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"{scans} queries scan a whole table, {sorts} sort without an index")
+        if scans and options["strict"]:
+            raise CommandError("Sequential scans found")
+
+    def pages(self):
+        supervisor = User.objects.annotate(projects=Count("project_supervisor")).order_by("-projects").first()
+        project = Project.objects.select_related("latest_document").order_by("-document_count").first()
+        document = project.latest_document if project else None
+        review = Project.reviewers.through.objects.values_list("user", "project").first()
+        if supervisor is None or document is None:
+            raise CommandError("No projects with documents to check, run seed_load first")
+
+        yield "teacher_index", supervisor, reverse("teacher_index")
+        yield "student_index", project.student, reverse("student_index")
+        yield "project", project.supervisor, reverse("project", args=[project.pk])
+        yield "document", project.supervisor, reverse("document", args=[document.pk])
+        if project.document_count > 1:
+            yield "document_changes", project.student, reverse("document_changes", args=[document.pk])
+        if review:
+            yield "review", User.objects.get(pk=review[0]), reverse("review", args=[review[1]])
+
+    def check_page(self, label, user, url):
+        client = Client(HTTP_HOST=self.options["host"])
+        client.force_login(user)
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = client.get(url)
+        self.stdout.write(f"{label} {url} -> {response.status_code}, {len(recorder.queries)} queries")
+
+        scans = sorts = 0
+        for sql, params in recorder.queries:
+            plan = self.explain(sql, params)
+            tables = self.scanned_tables(plan)
+            sorting = self.sorts(plan)
+            if tables:
+                scans += 1
+                self.stdout.write(f"  SCAN {', '.join(sorted(tables))}: {sql[:300]}")
+            elif sorting:
+                sorts += 1
+                self.stdout.write(f"  SORT: {sql[:300]}")
+            if self.options["verbose_plans"] or tables or sorting:
+                for line in plan:
+                    self.stdout.write(f"      {line}")
+        return scans, sorts
+
+    def explain(self, sql, params):
+        prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+        if connection.vendor == "sqlite":
+            return [row[-1] for row in rows]
+        return [row[0] for row in rows]
+
+    def scanned_tables(self, plan):
+        pattern = SQLITE_SCAN_RE if connection.vendor == "sqlite" else POSTGRES_SCAN_RE
+        tables = set()
+        for line in plan:
+            match = pattern.search(line.strip())
+            if match and match.group(1) in self.tables:
+                tables.add(match.group(1))
+        return tables
+
+    def sorts(self, plan):
+        pattern = SQLITE_SORT_RE if connection.vendor == "sqlite" else POSTGRES_SORT_RE
+        return any(pattern.search(line.strip()) for line in plan)
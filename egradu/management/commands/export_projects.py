@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from egradu import export
+
+
+class Command(BaseCommand):
+    help = "Export every project with its reviewers, grades and checks as CSV or XLSX."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(export.FORMATS), default="csv")
+        parser.add_argument("--output", default="-", help="File to write, - for standard output (CSV only).")
+
+    def handle(self, *args, **options):
+        chunks = export.export(options["format"])
+        if options["output"] == "-":
+            if options["format"] != "csv":
+                raise CommandError("XLSX exports need --output")
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending="")
+            return
+        with open(options["output"], "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
@@ -0,0 +1,45 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from egradu.models import Document, DocumentComments, DocumentText
+from egradu.odt import extract_path
+from egradu.storage import ContentAddressedStorage, document_storage
+
+
+class Command(BaseCommand):
+    help = "Extract and cache the text of every uploaded file that is not cached yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1)
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        storage = document_storage()
+        names = set(Document.objects.values_list("file", flat=True))
+        names |= set(Document.objects.exclude(abstract="").values_list("abstract", flat=True))
+        names |= set(DocumentComments.objects.exclude(commented_document="").values_list("commented_document", flat=True))
+        names.discard(None)
+        names.discard("")
+
+        cached = set(DocumentText.objects.values_list("digest", flat=True))
+        pending = []
+        for name in sorted(names):
+            digest = ContentAddressedStorage.digest(name)
+            if digest in cached or not storage.exists(name):
+                continue
+            if digest:
+                cached.add(digest)
+            pending.append((storage.path(name), digest))
+
+        created = 0
+        batch = []
+        with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+            paths, digests = zip(*pending) if pending else ((), ())
+            for digest, text, paragraphs, word_count in executor.map(extract_path, paths, digests, chunksize=4):
+                batch.append(DocumentText(digest=digest, text=text, paragraphs=paragraphs, word_count=word_count))
+                if len(batch) >= options["batch_size"]:
+                    created += len(DocumentText.objects.bulk_create(batch, ignore_conflicts=True))
+                    batch = []
+        created += len(DocumentText.objects.bulk_create(batch, ignore_conflicts=True))
+        self.stdout.write(f"{created} texts extracted")
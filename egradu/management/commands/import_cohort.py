@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from egradu.cohort import CohortError, import_records, records_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update users, their contacts and roles, and students' projects from a CSV or JSON file "
+        "with the columns username, email, first_name, last_name, roles and supervisor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file")
+        parser.add_argument("--dry-run", action="store_true", help="Validate and count without saving anything.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["file"], encoding="utf-8-sig", newline="") as file:
+                report = import_records(records_for(options["file"], file), dry_run=options["dry_run"])
+        except (OSError, CohortError) as error:
+            raise CommandError(error)
+
+        for line, message in report.errors:
+            self.stderr.write(f"Record {line}: {message}")
+        saved = "Would import" if options["dry_run"] or report.errors else "Imported"
+        self.stdout.write(
+            f"{saved} {report.created_users} new and {report.updated_users} updated users, "
+            f"{report.created_contacts} contacts, {report.added_roles} roles and {report.created_projects} projects"
+        )
+        if report.errors:
+            raise CommandError(f"{len(report.errors)} records have errors, nothing was saved")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from egradu.models import Document
+from egradu.plagiarism import index_document
+
+
+class Command(BaseCommand):
+    help = "Add every submitted document to the plagiarism index."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rebuild", action="store_true", help="Re-index documents that are already indexed.")
+
+    def handle(self, *args, **options):
+        documents = Document.objects.order_by("pk")
+        if not options["rebuild"]:
+            documents = documents.filter(signature__isnull=True)
+
+        indexed = skipped = 0
+        for document in documents.iterator(chunk_size=500):
+            if index_document(document):
+                indexed += 1
+            else:
+                skipped += 1
+        self.stdout.write(f"{indexed} documents indexed, {skipped} without extractable text")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from egradu.models import Document, DocumentComments
+from egradu.search import index_comment, index_document
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search entries for every document and comment."
+
+    def handle(self, *args, **options):
+        documents = comments = 0
+        for document in Document.objects.order_by("pk").iterator(chunk_size=200):
+            index_document(document)
+            documents += 1
+        for comment in DocumentComments.objects.order_by("pk").iterator(chunk_size=1000):
+            index_comment(comment)
+            comments += 1
+        self.stdout.write(f"{documents} documents and {comments} comments indexed")
@@ -0,0 +1,207 @@
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.timezone import now
+
+from egradu.loadtest import make_paragraphs, odt_bytes, revise, sentence, username
+from egradu.models import (
+    Contact, Document, DocumentComments, DocumentStatus, Evaluation, Grade, Job, JobStatus, LanguageCheck,
+    LastDocumentVisit, PlagiarismCheck, Project, UserType,
+)
+from egradu.storage import document_storage
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic cohort for load testing: students, supervisors and "
+        "reviewers plus one staff user, projects spread over every status, document versions, "
+        "comments and read history. Users are named <prefix>-<role>-<n> and "
+        "share one password, see benchmark_urls."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=200)
+        parser.add_argument("--supervisors", type=int, default=20)
+        parser.add_argument("--reviewers", type=int, default=20)
+        parser.add_argument("--versions", type=int, default=3, help="Most document versions per project.")
+        parser.add_argument("--comments", type=int, default=2, help="Most supervisor comments per version.")
+        parser.add_argument("--paragraphs", type=int, default=40)
+        parser.add_argument("--prefix", default="load")
+        parser.add_argument("--password", default="load")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--flush", action="store_true", help="Remove users created earlier with the same prefix.")
+        parser.add_argument("--skip-index", action="store_true", help="Do not rebuild the search index afterwards.")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        existing = User.objects.filter(username__startswith=f"{prefix}-")
+        if options["flush"]:
+            # Cascades to their projects, documents, comments and visits.
+            existing.delete()
+        elif existing.exists():
+            raise CommandError(f"Users with prefix {prefix!r} already exist, use --flush to replace them")
+        if min(options["students"], options["supervisors"], options["reviewers"], options["versions"]) < 1:
+            raise CommandError("Every count has to be at least one")
+
+        self.rng = random.Random(options["seed"])
+        self.storage = document_storage()
+        with transaction.atomic():
+            self.seed(options)
+
+        if not options["skip_index"]:
+            call_command("search_index", stdout=self.stdout)
+
+    def create_users(self, role, count, user_type):
+        users = User.objects.bulk_create(
+            User(username=username(self.prefix, role, i), password=self.password) for i in range(count)
+        )
+        contacts = Contact.objects.bulk_create(Contact(user=user) for user in users)
+        Contact.types.through.objects.bulk_create(
+            Contact.types.through(contact=contact, usertype=user_type) for contact in contacts
+        )
+        return users
+
+    def save_file(self, name, paragraphs):
+        return self.storage.save(name, ContentFile(odt_bytes(paragraphs)))
+
+    def seed(self, options):
+        rng = self.rng
+        self.prefix = options["prefix"]
+        # Hashing once keeps seeding thousands of users fast.
+        self.password = make_password(options["password"])
+        student_type, _ = UserType.objects.get_or_create(identifier="student", defaults={"name": "Student"})
+        teacher_type, _ = UserType.objects.get_or_create(identifier="teacher", defaults={"name": "Teacher"})
+
+        students = self.create_users("student", options["students"], student_type)
+        supervisors = self.create_users("supervisor", options["supervisors"], teacher_type)
+        reviewers = self.create_users("reviewer", options["reviewers"], teacher_type)
+        User.objects.create(username=username(self.prefix, "staff", 0), password=self.password, is_staff=True)
+
+        statuses = list(DocumentStatus)
+        projects = Project.objects.bulk_create(
+            Project(student=student, supervisor=rng.choice(supervisors), status=statuses[i % len(statuses)])
+            for i, student in enumerate(students)
+        )
+
+        started = now() - timedelta(days=120)
+        documents = []
+        for project, student in zip(projects, students):
+            paragraphs = make_paragraphs(rng, options["paragraphs"])
+            count = rng.randint(1, options["versions"])
+            for version in range(count):
+                if version:
+                    paragraphs = revise(rng, paragraphs)
+                latest = version == count - 1
+                uploaded = started + timedelta(days=version * 30 + rng.randint(0, 20), minutes=rng.randint(0, 1440))
+                abstract = None
+                if latest and rng.random() < 0.3:
+                    abstract = self.save_file(f"{student.username}-abstract.odt", paragraphs[:3])
+                document = Document(
+                    project=project,
+                    file=self.save_file(f"{student.username}.odt", paragraphs),
+                    abstract=abstract,
+                    latest_update=uploaded,
+                    draft=not latest or project.status == DocumentStatus.DRAFT,
+                )
+                document.seed_uploaded = uploaded
+                document.seed_paragraphs = paragraphs
+                documents.append(document)
+
+        Document.objects.bulk_create(documents, batch_size=500)
+        # uploaded is auto_now_add, so the spread out upload times are written
+        # in a second pass.
+        for document in documents:
+            document.uploaded = document.seed_uploaded
+        Document.objects.bulk_update(documents, ["uploaded"], batch_size=500)
+
+        latest_documents, document_counts = {}, Counter()
+        for document in documents:
+            latest_documents[document.project_id] = document
+            document_counts[document.project_id] += 1
+        for project in projects:
+            project.latest_document = latest_documents[project.pk]
+            project.document_count = document_counts[project.pk]
+            if project.status >= DocumentStatus.PENDING_PLAGIARISM:
+                project.final_version = latest_documents[project.pk]
+        Project.objects.bulk_update(
+            projects, ["final_version", "latest_document", "document_count"], batch_size=500,
+        )
+
+        comments, visits = [], []
+        supervisor_of = {project.pk: project.supervisor for project in projects}
+        student_of = {project.pk: project.student for project in projects}
+        for document in documents:
+            supervisor = supervisor_of[document.project_id]
+            for _ in range(rng.randint(0, options["comments"])):
+                commented = None
+                if rng.random() < 0.25:
+                    commented = self.save_file(
+                        f"{student_of[document.project_id].username}-comments.odt",
+                        revise(rng, document.seed_paragraphs, changes=1),
+                    )
+                comments.append(DocumentComments(
+                    document=document, user=supervisor, comment=sentence(rng, 30), commented_document=commented,
+                ))
+                document.latest_update = document.seed_uploaded + timedelta(hours=rng.randint(1, 72))
+            for user, chance in ((supervisor, 0.7), (student_of[document.project_id], 0.9)):
+                if rng.random() < chance:
+                    visits.append(LastDocumentVisit(
+                        document=document, user=user,
+                        time=document.seed_uploaded + timedelta(hours=rng.randint(0, 96)),
+                    ))
+        DocumentComments.objects.bulk_create(comments, batch_size=1000)
+        LastDocumentVisit.objects.bulk_create(visits, batch_size=1000)
+        Document.objects.bulk_update(documents, ["latest_update"], batch_size=500)
+
+        language_checks, plagiarism_checks, evaluations, reviewer_links = [], [], [], []
+        for project in projects:
+            status = project.status
+            if status >= DocumentStatus.LANGUAGE_CHECK:
+                language_checks.append(LanguageCheck(
+                    project=project, user=project.supervisor, comment=sentence(rng), grade=rng.choice(list(Grade)),
+                ))
+            if status >= DocumentStatus.PLAGIARISM_ONGOING:
+                # An ongoing check is the engine's report waiting for approval.
+                approved = None if status == DocumentStatus.PLAGIARISM_ONGOING else status >= DocumentStatus.EVALUATION
+                plagiarism_checks.append(PlagiarismCheck(
+                    project=project, user=project.supervisor, comment=sentence(rng), approved=approved,
+                ))
+            if status >= DocumentStatus.EVALUATION:
+                project_reviewers = rng.sample(reviewers, min(2, len(reviewers)))
+                reviewer_links.extend(
+                    Project.reviewers.through(project=project, user=reviewer) for reviewer in project_reviewers
+                )
+                # During evaluation at most one of the reviewers has answered.
+                done = project_reviewers if status >= DocumentStatus.PENDING_APPROVAL else project_reviewers[:rng.randint(0, 1)]
+                evaluations.extend(
+                    Evaluation(project=project, user=reviewer, comment=sentence(rng, 40), grade=rng.choice(list(Grade)))
+                    for reviewer in done
+                )
+        LanguageCheck.objects.bulk_create(language_checks)
+        PlagiarismCheck.objects.bulk_create(plagiarism_checks)
+        Evaluation.objects.bulk_create(evaluations)
+        Project.reviewers.through.objects.bulk_create(reviewer_links)
+
+        Job.objects.bulk_create(
+            Job(
+                name="plagiarism.check", user=project.supervisor, status=JobStatus.DONE,
+                payload={"project_id": project.pk, "user_id": project.supervisor_id}, attempts=1, finished=now(),
+            )
+            for project in projects if project.status >= DocumentStatus.PLAGIARISM_ONGOING
+        )
+
+        self.stdout.write(
+            f"{len(students)} students, {len(supervisors)} supervisors, {len(reviewers)} reviewers, "
+            f"{len(projects)} projects, {len(documents)} documents, {len(comments)} comments, "
+            f"{len(visits)} visits"
+        )
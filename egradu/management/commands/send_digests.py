@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from egradu.notifications import send_digests
+
+
+class Command(BaseCommand):
+    help = "Mail every user with pending notifications one digest of them. Meant to run from cron."
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Sent {send_digests()} digests")
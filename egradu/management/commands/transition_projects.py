@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from egradu.models import DocumentStatus, Project
+from egradu.transitions import bulk_transition
+
+
+def status(value):
+    result = DocumentStatus.get(value.upper()) or DocumentStatus.get(int(value) if value.isdigit() else None)
+    if result is None:
+        raise CommandError(f"Unknown status {value!r}")
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Move projects to another status, e.g. transition_projects approved "
+        "--status pending_approval. Projects whose current status cannot go "
+        "to the target are skipped and listed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("target", type=status, help="Status name or number to move to.")
+        parser.add_argument("projects", nargs="*", type=int, help="Project ids.")
+        parser.add_argument("--status", type=status, help="Only projects currently in this status.")
+        parser.add_argument("--supervisor", help="Only projects of this supervisor's username.")
+        parser.add_argument("--dry-run", action="store_true", help="Report without changing anything.")
+
+    def handle(self, *args, **options):
+        if not (options["projects"] or options["status"] is not None or options["supervisor"]):
+            raise CommandError("Give project ids, --status or --supervisor")
+
+        projects = Project.objects.all()
+        if options["projects"]:
+            projects = projects.filter(pk__in=options["projects"])
+        if options["status"] is not None:
+            projects = projects.filter(status=options["status"])
+        if options["supervisor"]:
+            projects = projects.filter(supervisor__username=options["supervisor"])
+
+        target = options["target"]
+        with transaction.atomic():
+            selected = set(projects.values_list("pk", flat=True))
+            report = bulk_transition({pk: target for pk in selected})
+            for pk in set(options["projects"]) - selected:
+                report.skipped[pk] = "does not exist or does not match the filters"
+            transaction.set_rollback(options["dry_run"])
+
+        verb = "Would move" if options["dry_run"] else "Moved"
+        self.stdout.write(f"{verb} {report.moved_count} projects to {target.label}")
+        for pk, reason in sorted(report.skipped.items()):
+            self.stdout.write(f"Skipped #{pk}: {reason}")
@@ -0,0 +1,222 @@
+import random
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+
+def sample_rate():
+    return getattr(settings, "EGRADU_METRICS_SAMPLE_RATE", 1.0)
+
+
+def sampled():
+    rate = sample_rate()
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+class QueryCollector:
+    # Installed as a database execute wrapper for the duration of a request,
+    # which works without DEBUG and sees every query on every connection.
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.seen = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - began
+            self.count += 1
+            self.seen[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.seen.values())
+
+    def installed(self):
+        # Returns the entered ExitStack, close() removes the wrappers again.
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "count", "sum", "max")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def quantile(self, fraction):
+        # Upper bound of the bucket holding the quantile, capped by the
+        # largest value seen.
+        target, cumulative = fraction * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class ViewStats:
+    def __init__(self):
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.sql_time = 0.0
+        self.duplicates = 0
+        self.response_bytes = 0
+        self.statuses = Counter()
+
+    def observe(self, status, duration, collector, size):
+        self.duration.observe(duration)
+        self.queries.observe(collector.count)
+        self.sql_time += collector.time
+        self.duplicates += collector.duplicates
+        self.response_bytes += size
+        self.statuses[status] += 1
+
+    def merge(self, other):
+        self.duration.merge(other.duration)
+        self.queries.merge(other.queries)
+        self.sql_time += other.sql_time
+        self.duplicates += other.duplicates
+        self.response_bytes += other.response_bytes
+        self.statuses.update(other.statuses)
+
+    @property
+    def requests(self):
+        return self.duration.count
+
+
+class Registry:
+    # Totals since the process started are exported to Prometheus, which
+    # computes rates itself. The admin panel reads the per-minute buckets of
+    # the last EGRADU_METRICS_WINDOW_MINUTES instead.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = defaultdict(ViewStats)
+        self.minutes = deque()
+
+    def record(self, view, status, duration, collector, size):
+        minute = int(time.time() // 60)
+        with self.lock:
+            self.totals[view].observe(status, duration, collector, size)
+            if not self.minutes or self.minutes[-1][0] != minute:
+                self.minutes.append((minute, defaultdict(ViewStats)))
+                self.expire(minute)
+            self.minutes[-1][1][view].observe(status, duration, collector, size)
+
+    def expire(self, minute):
+        window = getattr(settings, "EGRADU_METRICS_WINDOW_MINUTES", 60)
+        while self.minutes and self.minutes[0][0] <= minute - window:
+            self.minutes.popleft()
+
+    def recent(self):
+        merged = defaultdict(ViewStats)
+        with self.lock:
+            self.expire(int(time.time() // 60))
+            for _, views in self.minutes:
+                for view, stats in views.items():
+                    merged[view].merge(stats)
+        return dict(merged)
+
+    def reset(self):
+        with self.lock:
+            self.totals.clear()
+            self.minutes.clear()
+
+    def prometheus(self):
+        with self.lock:
+            totals = {view: stats for view, stats in sorted(self.totals.items())}
+            lines = [
+                "# HELP egradu_metrics_sample_rate Fraction of requests that are measured.",
+                "# TYPE egradu_metrics_sample_rate gauge",
+                f"egradu_metrics_sample_rate {sample_rate()}",
+            ]
+            lines += histogram_lines(
+                "egradu_request_duration_seconds", "Time spent handling the request.",
+                {view: stats.duration for view, stats in totals.items()},
+            )
+            lines += histogram_lines(
+                "egradu_request_queries", "Database queries per request.",
+                {view: stats.queries for view, stats in totals.items()},
+            )
+            for name, help_text, attribute in (
+                ("egradu_request_sql_seconds_total", "Time spent in database queries.", "sql_time"),
+                ("egradu_request_duplicate_queries_total", "Queries repeated with identical SQL and parameters.", "duplicates"),
+                ("egradu_response_bytes_total", "Response body size.", "response_bytes"),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f'{name}{{view="{view}"}} {getattr(stats, attribute)}' for view, stats in totals.items()]
+            lines += ["# HELP egradu_responses_total Responses by status code.", "# TYPE egradu_responses_total counter"]
+            lines += [
+                f'egradu_responses_total{{view="{view}",status="{status}"}} {count}'
+                for view, stats in totals.items()
+                for status, count in sorted(stats.statuses.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def histogram_lines(name, help_text, histograms):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for view, histogram in histograms.items():
+        for bound, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{{view="{view}",le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {histogram.count}')
+        lines.append(f'{name}_sum{{view="{view}"}} {histogram.sum}')
+        lines.append(f'{name}_count{{view="{view}"}} {histogram.count}')
+    return lines
+
+
+registry = Registry()
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or "unnamed"
+
+
+def response_size(response):
+    if response.streaming:
+        return int(response.get("Content-Length") or 0)
+    return len(response.content)
+
+
+def record(request, response, duration, collector):
+    registry.record(view_name(request), response.status_code, duration, collector, response_size(response))
@@ -0,0 +1,70 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics
+from .roles import resolve_roles
+
+
+class RolesMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.egradu_roles = SimpleLazyObject(lambda: resolve_roles(request.user))
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Async views cannot hit the database from a lazy attribute, so the
+        # user and roles are resolved here. Under ASGI Django runs this hook
+        # in a thread.
+        if iscoroutinefunction(view_func):
+            request.egradu_roles.is_student
+
+
+class MetricsMiddleware:
+    # Records duration, queries and response size per URL name for a sample
+    # of requests, see egradu.metrics. Requests outside the sample only pay
+    # for one random number.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not metrics.sampled():
+            return self.get_response(request)
+
+        collector = metrics.QueryCollector()
+        began = time.perf_counter()
+        with collector.installed():
+            response = self.get_response(request)
+        metrics.record(request, response, time.perf_counter() - began, collector)
+        return response
+
+    async def __acall__(self, request):
+        if not metrics.sampled():
+            return await self.get_response(request)
+
+        collector = metrics.QueryCollector()
+        began = time.perf_counter()
+        # Database connections belong to a thread, so the wrapper goes on the
+        # thread-sensitive thread that runs the async ORM calls.
+        installed = await sync_to_async(collector.installed)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(installed.close)()
+        metrics.record(request, response, time.perf_counter() - began, collector)
+        return response
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("egradu", "0005_alter_evaluation_other_reviewer"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="lastdocumentvisit",
+            index=models.Index(fields=["document", "user", "-time"], name="egradu_visit_doc_user_time"),
+        ),
+    ]
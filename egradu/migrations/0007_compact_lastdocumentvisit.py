@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:15
+
+from django.db import migrations, models
+from django.db.models import Max
+import django.utils.timezone
+
+
+def compact_visits(apps, schema_editor):
+    LastDocumentVisit = apps.get_model("egradu", "LastDocumentVisit")
+    # Rows are append-only, so the highest id of each (document, user) pair is
+    # the latest visit and the only one the read cursor needs to keep.
+    latest = LastDocumentVisit.objects.values("document", "user").annotate(latest=Max("id")).values_list("latest")
+    LastDocumentVisit.objects.exclude(id__in=latest).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("egradu", "0006_lastdocumentvisit_doc_user_time"),
+    ]
+
+    operations = [
+        migrations.RunPython(compact_visits, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="lastdocumentvisit",
+            name="egradu_visit_doc_user_time",
+        ),
+        migrations.AlterField(
+            model_name="lastdocumentvisit",
+            name="time",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddConstraint(
+            model_name="lastdocumentvisit",
+            constraint=models.UniqueConstraint(fields=("document", "user"), name="egradu_visit_document_user"),
+        ),
+    ]
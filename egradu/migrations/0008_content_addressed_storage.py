@@ -0,0 +1,39 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:19
+
+from django.db import migrations, models
+import egradu.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("egradu", "0007_compact_lastdocumentvisit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("digest", models.CharField(max_length=64, unique=True)),
+                ("name", models.CharField(max_length=255)),
+                ("size", models.BigIntegerField()),
+                ("references", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="document",
+            name="abstract",
+            field=models.FileField(blank=True, max_length=255, null=True, storage=egradu.storage.document_storage, upload_to=""),
+        ),
+        migrations.AlterField(
+            model_name="document",
+            name="file",
+            field=models.FileField(max_length=255, storage=egradu.storage.document_storage, upload_to=""),
+        ),
+        migrations.AlterField(
+            model_name="documentcomments",
+            name="commented_document",
+            field=models.FileField(blank=True, max_length=255, null=True, storage=egradu.storage.document_storage, upload_to=""),
+        ),
+    ]
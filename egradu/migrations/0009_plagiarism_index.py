@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("egradu", "0008_content_addressed_storage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentSignature",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("signature", models.BinaryField()),
+                ("shingle_count", models.PositiveIntegerField()),
+                ("document", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="signature", to="egradu.document")),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PlagiarismMatch",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("similarity", models.FloatField()),
+                ("document", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="+", to="egradu.document")),
+                ("plagiarism_check", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="matches", to="egradu.plagiarismcheck")),
+            ],
+            options={
+                "ordering": ["-similarity"],
+            },
+        ),
+        migrations.CreateModel(
+            name="SignatureBucket",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.BigIntegerField()),
+                ("signature", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="buckets", to="egradu.documentsignature")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["key"], name="egradu_signature_bucket_key")],
+            },
+        ),
+    ]
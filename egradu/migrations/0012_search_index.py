@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django_enumfield.db.fields
+import egradu.models
+
+
+SQLITE_FORWARDS = [
+    "CREATE VIRTUAL TABLE egradu_searchentry_fts USING fts5("
+    "body, content='egradu_searchentry', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER egradu_searchentry_ai AFTER INSERT ON egradu_searchentry BEGIN "
+    "INSERT INTO egradu_searchentry_fts(rowid, body) VALUES (new.id, new.body); END",
+    "CREATE TRIGGER egradu_searchentry_ad AFTER DELETE ON egradu_searchentry BEGIN "
+    "INSERT INTO egradu_searchentry_fts(egradu_searchentry_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+    "CREATE TRIGGER egradu_searchentry_au AFTER UPDATE ON egradu_searchentry BEGIN "
+    "INSERT INTO egradu_searchentry_fts(egradu_searchentry_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+    "INSERT INTO egradu_searchentry_fts(rowid, body) VALUES (new.id, new.body); END",
+]
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS egradu_searchentry_au",
+    "DROP TRIGGER IF EXISTS egradu_searchentry_ad",
+    "DROP TRIGGER IF EXISTS egradu_searchentry_ai",
+    "DROP TABLE IF EXISTS egradu_searchentry_fts",
+]
+# Must match the expression SearchVector("body", config="simple") compiles to.
+POSTGRESQL_FORWARDS = [
+    "CREATE INDEX egradu_searchentry_body_gin ON egradu_searchentry "
+    "USING GIN (to_tsvector('simple'::regconfig, COALESCE(body, '')))",
+]
+POSTGRESQL_BACKWARDS = [
+    "DROP INDEX IF EXISTS egradu_searchentry_body_gin",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("egradu", "0011_document_text"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", django_enumfield.db.fields.EnumField(enum=egradu.models.SearchKind)),
+                ("body", models.TextField()),
+                ("comment", models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to="egradu.documentcomments")),
+                ("document", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="egradu.document")),
+            ],
+        ),
+        migrations.RunPython(
+            run_for_vendor({"sqlite": SQLITE_FORWARDS, "postgresql": POSTGRESQL_FORWARDS}),
+            run_for_vendor({"sqlite": SQLITE_BACKWARDS, "postgresql": POSTGRESQL_BACKWARDS}),
+        ),
+    ]
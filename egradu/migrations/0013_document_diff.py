@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("egradu", "0012_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentDiff",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("old_digest", models.CharField(max_length=64)),
+                ("new_digest", models.CharField(max_length=64)),
+                ("hunks", models.JSONField(default=list)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="documentdiff",
+            constraint=models.UniqueConstraint(fields=("old_digest", "new_digest"), name="egradu_diff_digests"),
+        ),
+    ]
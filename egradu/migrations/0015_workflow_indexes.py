@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:52
+
+from django.db import migrations, models
+import egradu.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("egradu", "0014_uploadsession"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(fields=["project", "-uploaded"], name="egradu_document_project"),
+        ),
+        migrations.AddIndex(
+            model_name="evaluation",
+            index=models.Index(fields=["user", "project"], name="egradu_evaluation_user"),
+        ),
+        migrations.AddIndex(
+            model_name="lastdocumentvisit",
+            index=models.Index(fields=["user", "-time"], name="egradu_visit_user_time"),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(fields=["supervisor", "status"], name="egradu_project_supervisor"),
+        ),
+        migrations.AddIndex(
+            model_name="project",
+            index=models.Index(condition=models.Q(("status__lt", egradu.models.DocumentStatus(41))), fields=["status"], name="egradu_project_active"),
+        ),
+    ]
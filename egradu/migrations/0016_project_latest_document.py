@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:55
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_latest_document(apps, schema_editor):
+    Document = apps.get_model("egradu", "Document")
+    Project = apps.get_model("egradu", "Project")
+    # Same as ProjectQuerySet.refresh_documents, which is not available here.
+    documents = Document.objects.filter(project=OuterRef("pk")).order_by()
+    Project.objects.update(
+        latest_document=Subquery(documents.order_by("-uploaded", "-pk").values("pk")[:1]),
+        document_count=Coalesce(Subquery(documents.values("project").annotate(count=Count("pk")).values("count")), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("egradu", "0015_workflow_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="project",
+            name="document_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="project",
+            name="latest_document",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to="egradu.document"),
+        ),
+        migrations.RunPython(fill_latest_document, migrations.RunPython.noop),
+    ]
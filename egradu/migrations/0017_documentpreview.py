@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+import egradu.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("egradu", "0016_project_latest_document"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentPreview",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("digest", models.CharField(max_length=64, unique=True)),
+                ("pdf", models.FileField(blank=True, max_length=255, storage=egradu.storage.document_storage, upload_to="")),
+                ("error", models.TextField(blank=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PreviewPage",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("number", models.PositiveIntegerField()),
+                ("image", models.FileField(max_length=255, storage=egradu.storage.document_storage, upload_to="")),
+                ("preview", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="pages", to="egradu.documentpreview")),
+            ],
+            options={
+                "ordering": ["number"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="previewpage",
+            constraint=models.UniqueConstraint(fields=("preview", "number"), name="egradu_preview_page"),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import django_enumfield.db.fields
+import egradu.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("egradu", "0017_documentpreview"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatusDay",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("status", django_enumfield.db.fields.EnumField(default=0, enum=egradu.models.DocumentStatus)),
+                ("entered", models.PositiveIntegerField(default=0)),
+                ("left", models.PositiveIntegerField(default=0)),
+                ("median_duration", models.DurationField(blank=True, null=True)),
+                ("supervisor", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StatusTransition",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("from_status", django_enumfield.db.fields.EnumField(blank=True, default=None, enum=egradu.models.DocumentStatus, null=True)),
+                ("to_status", django_enumfield.db.fields.EnumField(default=0, enum=egradu.models.DocumentStatus)),
+                ("time", models.DateTimeField(default=django.utils.timezone.now)),
+                ("duration", models.DurationField(blank=True, null=True)),
+                ("project", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="transitions", to="egradu.project")),
+                ("supervisor", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["project", "-time"], name="egradu_transition_project"), models.Index(fields=["time"], name="egradu_transition_time")],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="statusday",
+            constraint=models.UniqueConstraint(fields=("day", "status", "supervisor"), name="egradu_status_day_supervisor"),
+        ),
+        migrations.AddConstraint(
+            model_name="statusday",
+            constraint=models.UniqueConstraint(condition=models.Q(("supervisor__isnull", True)), fields=("day", "status"), name="egradu_status_day"),
+        ),
+    ]
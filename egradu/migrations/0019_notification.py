@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django_enumfield.db.fields
+import egradu.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("egradu", "0018_status_history"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Notification",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", django_enumfield.db.fields.EnumField(enum=egradu.models.NotificationKind)),
+                ("status", django_enumfield.db.fields.EnumField(blank=True, default=None, enum=egradu.models.DocumentStatus, null=True)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                ("sent", models.DateTimeField(blank=True, null=True)),
+                ("project", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="+", to="egradu.project")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="+", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "indexes": [models.Index(condition=models.Q(("sent__isnull", True)), fields=["user", "created"], name="egradu_notification_pending")],
+            },
+        ),
+    ]
@@ -1,8 +1,20 @@
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
+from django.utils.functional import cached_property
+from django.utils.timezone import now
 from django.db import models
+from django.db.models import Case, When, F, Q, FilteredRelation, BooleanField, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django_enumfield import enum
 from django.contrib.auth import get_user_model
 
+from .odt import extract_text
+from .storage import document_storage, file_digest
+
 
 User = get_user_model()
 
@@ -41,7 +53,7 @@ class DocumentStatus(enum.Enum):
         EVALUATION: (PLAGIARISM,),
         PENDING_APPROVAL: (EVALUATION,),
         APPROVED: (PENDING_APPROVAL,),
-        DENIED: (PENDING_APPROVAL),
+        DENIED: (PENDING_APPROVAL,),
     }
 
     __default__ = DRAFT
@@ -62,40 +74,204 @@ class Grade(enum.Enum):
     }
 
 
+class JobStatus(enum.Enum):
+    QUEUED = 0
+    RUNNING = 1
+    DONE = 2
+    FAILED = 3
+
+    __labels__ = {
+        QUEUED: _("Queued"),
+        RUNNING: _("Running"),
+        DONE: _("Done"),
+        FAILED: _("Failed"),
+    }
+
+    __default__ = QUEUED
+
+
+class SearchKind(enum.Enum):
+    DOCUMENT = 0
+    ABSTRACT = 1
+    COMMENT = 2
+
+    __labels__ = {
+        DOCUMENT: _("Document"),
+        ABSTRACT: _("Abstract"),
+        COMMENT: _("Comment"),
+    }
+
+
+class NotificationKind(enum.Enum):
+    UPLOAD = 0
+    COMMENT = 1
+    STATUS = 2
+
+    __labels__ = {
+        UPLOAD: _("New version"),
+        COMMENT: _("New comment"),
+        STATUS: _("Status change"),
+    }
+
+
 class UserType(models.Model):
     name = models.CharField(max_length=255)
     identifier = models.CharField(max_length=255)
 
 
+class ProjectQuerySet(models.QuerySet):
+    def involving(self, user):
+        # Projects the user writes, supervises or reviews.
+        reviewed = Project.reviewers.through.objects.filter(user=user).values("project")
+        return self.filter(Q(student=user) | Q(supervisor=user) | Q(pk__in=reviewed))
+
+    def refresh_documents(self):
+        # Recomputes latest_document and document_count from the documents,
+        # for writes that do not go through UploadDocumentForm.
+        documents = Document.objects.filter(project=OuterRef("pk")).order_by()
+        return self.update(
+            latest_document=Subquery(documents.order_by("-uploaded", "-pk").values("pk")[:1]),
+            document_count=Coalesce(
+                Subquery(documents.values("project").annotate(count=Count("pk")).values("count")), 0,
+            ),
+        )
+
+
 class Project(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=["supervisor", "status"], name="egradu_project_supervisor"),
+            # Approved and denied projects are the bulk of the table after a
+            # few years and no dashboard lists them.
+            models.Index(
+                fields=["status"], name="egradu_project_active",
+                condition=Q(status__lt=DocumentStatus.APPROVED),
+            ),
+        ]
+
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name="project_student")
     supervisor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="project_supervisor")
     reviewers = models.ManyToManyField(User, related_name="project_reviewer")
     final_version = models.ForeignKey("Document", on_delete=models.CASCADE, null=True, related_name="projects")
     status = enum.EnumField(DocumentStatus)
+    # Maintained by UploadDocumentForm.save so that the current version is a
+    # single join instead of sorting every upload of the thesis.
+    latest_document = models.ForeignKey(
+        "Document", on_delete=models.SET_NULL, null=True, blank=True, related_name="+",
+    )
+    document_count = models.PositiveIntegerField(default=0)
+
+    objects = ProjectQuerySet.as_manager()
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Compared on save to record status changes, see signals.project_saved.
+        instance._saved_status = instance.__dict__.get("status")
+        return instance
+
+
+class StoredFiles:
+    # Remembers the names of stored_files as loaded, so that a replaced file's
+    # blob can be released on save, see signals.stored_files_saved.
+    stored_files = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_files = {
+            name: getattr(instance.__dict__[name], "name", instance.__dict__[name]) or None
+            for name in cls.stored_files if name in instance.__dict__
+        }
+        return instance
+
+
+class DocumentQuerySet(models.QuerySet):
+    def with_read_state(self, user):
+        # LastDocumentVisit holds at most one row per (document, user), so the
+        # unread flag is a single LEFT JOIN on its unique index.
+        return self.annotate(
+            visit=FilteredRelation("lastdocumentvisit", condition=Q(lastdocumentvisit__user=user)),
+        ).annotate(
+            update=Case(
+                When(latest_update__lt=F("visit__time"), then=False),
+                default=True,
+                output_field=BooleanField(),
+            )
+        )
+
+
+class Document(StoredFiles, models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=["project", "-uploaded"], name="egradu_document_project"),
+        ]
 
-class Document(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True)
-    file = models.FileField()
-    abstract = models.FileField(null=True, blank=True)
+    file = models.FileField(storage=document_storage, max_length=255)
+    abstract = models.FileField(storage=document_storage, max_length=255, null=True, blank=True)
     uploaded = models.DateTimeField(auto_now_add=True)
     latest_update = models.DateTimeField(null=True, blank=True)
     draft = models.BooleanField(default=True)
 
+    objects = DocumentQuerySet.as_manager()
+    stored_files = ("file", "abstract")
+
+    @property
+    def filename(self):
+        return os.path.basename(self.file.name)
+
+    @cached_property
+    def text(self):
+        return DocumentText.objects.for_file(self.file)
+
+
+class LastDocumentVisitQuerySet(models.QuerySet):
+    def touch(self, document, user, coalesce=True):
+        # Moves the user's read cursor to now. With coalesce the write is
+        # skipped if the cursor moved within EGRADU_VISIT_COALESCE_SECONDS and
+        # is already past the document's latest update.
+        time = now()
+        visits = self.filter(document=document, user=user)
+        if coalesce:
+            window = getattr(settings, "EGRADU_VISIT_COALESCE_SECONDS", 60)
+            cursor = visits.values_list("time", flat=True).first()
+            if (
+                cursor is not None
+                and cursor >= time - timedelta(seconds=window)
+                and (document.latest_update is None or cursor > document.latest_update)
+            ):
+                return
+
+        if not visits.update(time=time):
+            # No cursor yet. A concurrent request may have created it since.
+            self.bulk_create([self.model(document=document, user=user, time=time)], ignore_conflicts=True)
+
 
 class LastDocumentVisit(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["document", "user"], name="egradu_visit_document_user"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-time"], name="egradu_visit_user_time"),
+        ]
+
     document = models.ForeignKey(Document, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    time = models.DateTimeField(auto_now_add=True)
+    time = models.DateTimeField(default=now)
 
+    objects = LastDocumentVisitQuerySet.as_manager()
 
-class DocumentComments(models.Model):
+
+class DocumentComments(StoredFiles, models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE)
-    commented_document = models.FileField(blank=True, null=True)
+    commented_document = models.FileField(storage=document_storage, max_length=255, blank=True, null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     comment = models.TextField()
 
+    stored_files = ("commented_document",)
+
 
 class CheckBase(models.Model):
     class Meta:
@@ -116,7 +292,37 @@ class PlagiarismCheck(CheckBase):
     approved = models.BooleanField(null=True)
 
 
+class PlagiarismMatch(models.Model):
+    class Meta:
+        ordering = ["-similarity"]
+
+    plagiarism_check = models.ForeignKey(PlagiarismCheck, on_delete=models.CASCADE, related_name="matches")
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name="+")
+    similarity = models.FloatField()
+
+
+class DocumentSignature(models.Model):
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name="signature")
+    signature = models.BinaryField()
+    shingle_count = models.PositiveIntegerField()
+
+
+class SignatureBucket(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=["key"], name="egradu_signature_bucket_key"),
+        ]
+
+    signature = models.ForeignKey(DocumentSignature, on_delete=models.CASCADE, related_name="buckets")
+    key = models.BigIntegerField()
+
+
 class Evaluation(CheckBase):
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "project"], name="egradu_evaluation_user"),
+        ]
+
     other_reviewer = models.ForeignKey(
         User, on_delete=models.CASCADE,
         null=True,related_name="other_reviewer",
@@ -124,6 +330,170 @@ class Evaluation(CheckBase):
     )
 
 
+class Blob(models.Model):
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    references = models.PositiveIntegerField(default=0)
+
+
+class Job(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="egradu_job_status_run_after"),
+        ]
+
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    status = enum.EnumField(JobStatus)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=now)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+
+class DocumentTextQuerySet(models.QuerySet):
+    def for_file(self, field_file):
+        digest = file_digest(field_file)
+        document_text = self.filter(digest=digest).first()
+        if document_text is None:
+            with field_file.open("rb") as file:
+                text, paragraphs, word_count = extract_text(file)
+            document_text, _ = self.get_or_create(
+                digest=digest,
+                defaults={"text": text, "paragraphs": paragraphs, "word_count": word_count},
+            )
+        return document_text
+
+
+class DocumentText(models.Model):
+    # Extracted once per unique file content, shared by every upload of it.
+    digest = models.CharField(max_length=64, unique=True)
+    text = models.TextField()
+    paragraphs = models.JSONField(default=list)
+    word_count = models.PositiveIntegerField(default=0)
+
+    objects = DocumentTextQuerySet.as_manager()
+
+    def paragraph_list(self):
+        ends = [start - 2 for start in self.paragraphs[1:]] + [len(self.text)]
+        return [self.text[start:end] for start, end in zip(self.paragraphs, ends)]
+
+
+class DocumentPreview(StoredFiles, models.Model):
+    # Rendered once per unique file content by the preview.render job. A row
+    # without pdf or error is a conversion in progress.
+    stored_files = ("pdf",)
+
+    digest = models.CharField(max_length=64, unique=True)
+    pdf = models.FileField(storage=document_storage, max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+
+class PreviewPage(StoredFiles, models.Model):
+    stored_files = ("image",)
+
+    class Meta:
+        ordering = ["number"]
+        constraints = [
+            models.UniqueConstraint(fields=["preview", "number"], name="egradu_preview_page"),
+        ]
+
+    preview = models.ForeignKey(DocumentPreview, on_delete=models.CASCADE, related_name="pages")
+    number = models.PositiveIntegerField()
+    image = models.FileField(storage=document_storage, max_length=255)
+
+
+class DocumentDiff(models.Model):
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["old_digest", "new_digest"], name="egradu_diff_digests"),
+        ]
+
+    old_digest = models.CharField(max_length=64)
+    new_digest = models.CharField(max_length=64)
+    hunks = models.JSONField(default=list)
+
+
+class SearchEntry(models.Model):
+    # The full-text index itself is database specific, see migration 0012.
+    document = models.ForeignKey(Document, on_delete=models.CASCADE)
+    comment = models.OneToOneField(DocumentComments, on_delete=models.CASCADE, null=True, blank=True)
+    kind = enum.EnumField(SearchKind)
+    body = models.TextField()
+
+
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    stored_name = models.CharField(max_length=255, blank=True)
+
+
+class StatusTransition(models.Model):
+    # Append-only, one row per status change written by history.record.
+    # duration is the time spent in from_status, unknown for the first change
+    # recorded for a project.
+    class Meta:
+        indexes = [
+            models.Index(fields=["project", "-time"], name="egradu_transition_project"),
+            models.Index(fields=["time"], name="egradu_transition_time"),
+        ]
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="transitions")
+    supervisor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    from_status = enum.EnumField(DocumentStatus, null=True, blank=True, default=None)
+    to_status = enum.EnumField(DocumentStatus)
+    time = models.DateTimeField(default=now)
+    duration = models.DurationField(null=True, blank=True)
+
+
+class StatusDay(models.Model):
+    # Daily rollup of StatusTransition per status and supervisor, rows without
+    # a supervisor cover the whole department.
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "status", "supervisor"], name="egradu_status_day_supervisor"),
+            models.UniqueConstraint(
+                fields=["day", "status"], name="egradu_status_day",
+                condition=Q(supervisor__isnull=True),
+            ),
+        ]
+
+    day = models.DateField()
+    status = enum.EnumField(DocumentStatus)
+    supervisor = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    entered = models.PositiveIntegerField(default=0)
+    left = models.PositiveIntegerField(default=0)
+    median_duration = models.DurationField(null=True, blank=True)
+
+
+class Notification(models.Model):
+    # Pending until send_digests mails it in the user's next digest.
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "created"], name="egradu_notification_pending",
+                condition=Q(sent__isnull=True),
+            ),
+        ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="+")
+    kind = enum.EnumField(NotificationKind)
+    status = enum.EnumField(DocumentStatus, null=True, blank=True, default=None)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+
 class Contact(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     types = models.ManyToManyField(UserType)
@@ -0,0 +1,108 @@
+from collections import Counter, defaultdict
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.timezone import now
+
+from .models import DocumentStatus, Notification, NotificationKind, Project
+
+
+def document_uploaded(document):
+    project = Project.objects.filter(pk=document.project_id).values("pk", "supervisor").first()
+    if project:
+        Notification.objects.create(user_id=project["supervisor"], project_id=project["pk"], kind=NotificationKind.UPLOAD)
+
+
+def comment_added(comment):
+    project = Project.objects.filter(document=comment.document_id).values("pk", "supervisor").first()
+    # Supervisors hear about what others write on their students' drafts.
+    if project and project["supervisor"] != comment.user_id:
+        Notification.objects.create(user_id=project["supervisor"], project_id=project["pk"], kind=NotificationKind.COMMENT)
+
+
+def status_changed(changes):
+    # changes are (project_id, supervisor_id, status) tuples. Projects waiting
+    # for plagiarism are the supervisor's to send on, evaluations the
+    # reviewers' to write.
+    evaluations = [project_id for project_id, _, status in changes if status == DocumentStatus.EVALUATION]
+    reviewers = defaultdict(list)
+    if evaluations:
+        through = Project.reviewers.through.objects.filter(project__in=evaluations)
+        for project_id, user_id in through.values_list("project", "user"):
+            reviewers[project_id].append(user_id)
+
+    notifications = []
+    for project_id, supervisor_id, status in changes:
+        if status == DocumentStatus.PENDING_PLAGIARISM:
+            recipients = [supervisor_id]
+        elif status == DocumentStatus.EVALUATION:
+            recipients = reviewers[project_id]
+        else:
+            continue
+        notifications += [
+            Notification(user_id=user_id, project_id=project_id, kind=NotificationKind.STATUS, status=status)
+            for user_id in recipients
+        ]
+    Notification.objects.bulk_create(notifications)
+
+
+def summary(notification, count):
+    if notification.kind == NotificationKind.UPLOAD:
+        return f"{count} new version{'s' if count > 1 else ''} uploaded"
+    if notification.kind == NotificationKind.COMMENT:
+        return f"{count} new comment{'s' if count > 1 else ''}"
+    return f"Moved to {notification.status.label}"
+
+
+def digest_message(user, notifications):
+    # Repeated events of one kind on a project become a single line.
+    counts = Counter((notification.project_id, notification.kind, notification.status) for notification in notifications)
+    projects = {}
+    for notification in notifications:
+        key = (notification.project_id, notification.kind, notification.status)
+        if key in counts:
+            projects.setdefault(notification.project, []).append(summary(notification, counts.pop(key)))
+
+    body = render_to_string("egradu/email/digest.txt", {
+        "user": user,
+        "projects": projects.items(),
+        "url": settings.EGRADU_SITE_URL.rstrip("/") + reverse("teacher_index"),
+    })
+    subject = f"eGradu: updates on {len(projects)} thes{'es' if len(projects) > 1 else 'is'}"
+    return EmailMessage(subject, body, to=[user.email])
+
+
+def send_digests():
+    # One SMTP connection is opened for the whole run. Every batch of users is
+    # locked, sent and marked in its own transaction, so a failed batch is
+    # retried by the next run and concurrent runs skip each other's rows.
+    batch_size = getattr(settings, "EGRADU_DIGEST_BATCH_SIZE", 100)
+    users = list(
+        Notification.objects.filter(sent__isnull=True).order_by("user").values_list("user", flat=True).distinct()
+    )
+    if not users:
+        return 0
+    sent = 0
+    with get_connection() as connection:
+        for start in range(0, len(users), batch_size):
+            with transaction.atomic():
+                notifications = list(
+                    Notification.objects.select_for_update(skip_locked=True, of=("self",))
+                    .filter(sent__isnull=True, user__in=users[start:start + batch_size])
+                    .select_related("user", "project__student").order_by("user", "created", "pk")
+                )
+                messages = [
+                    digest_message(user, list(pending))
+                    for user, pending in groupby(notifications, key=lambda notification: notification.user)
+                    if user.email
+                ]
+                connection.send_messages(messages)
+                # Users without an address are marked too, or their
+                # notifications would pile up.
+                Notification.objects.filter(pk__in=[notification.pk for notification in notifications]).update(sent=now())
+            sent += len(messages)
+    return sent
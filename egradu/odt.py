@@ -0,0 +1,72 @@
+import hashlib
+import re
+import zipfile
+from xml.etree import ElementTree
+
+
+TEXT_NS = "urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+PARAGRAPH = f"{{{TEXT_NS}}}p"
+HEADING = f"{{{TEXT_NS}}}h"
+SPACE = f"{{{TEXT_NS}}}s"
+TAB = f"{{{TEXT_NS}}}tab"
+LINE_BREAK = f"{{{TEXT_NS}}}line-break"
+
+WORD_RE = re.compile(r"\w+")
+
+
+def element_text(element):
+    parts = [element.text or ""]
+    for child in element:
+        if child.tag == SPACE:
+            parts.append(" " * int(child.get(f"{{{TEXT_NS}}}c", 1)))
+        elif child.tag == TAB:
+            parts.append("\t")
+        elif child.tag == LINE_BREAK:
+            parts.append("\n")
+        else:
+            parts.append(element_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def iter_paragraphs(file):
+    # content.xml is parsed incrementally and every paragraph is cleared as
+    # soon as its text is read, so memory use does not grow with the document.
+    try:
+        with zipfile.ZipFile(file) as archive, archive.open("content.xml") as content:
+            for _, element in ElementTree.iterparse(content):
+                if element.tag in (PARAGRAPH, HEADING):
+                    text = element_text(element).strip()
+                    if text:
+                        yield text
+                    element.clear()
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as error:
+        raise ValueError(f"Not an OpenDocument text file: {error}") from error
+
+
+def extract_text(file):
+    # Paragraphs are joined with a blank line; offsets holds the position in
+    # text where each paragraph starts.
+    parts, offsets, position, word_count = [], [], 0, 0
+    try:
+        for paragraph in iter_paragraphs(file):
+            offsets.append(position)
+            parts.append(paragraph)
+            position += len(paragraph) + 2
+            word_count += len(WORD_RE.findall(paragraph))
+    except ValueError:
+        return "", [], 0
+    return "\n\n".join(parts), offsets, word_count
+
+
+def extract_path(path, digest=None):
+    # Used by the extract_texts worker pool; hashes files stored before
+    # content-addressed storage whose name does not carry the digest.
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(64 * 1024), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+    with open(path, "rb") as file:
+        return (digest, *extract_text(file))
@@ -0,0 +1,83 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+PAGE_SIZE = 20
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class KeysetPaginator:
+    # Pages by the sort key of the last row shown instead of an offset, so a
+    # deep page reads as few rows as the first one and rows added meanwhile do
+    # not shift the pages. The ordering has to end in a unique field and all
+    # fields have to sort in the same direction.
+    def __init__(self, queryset, ordering, per_page=PAGE_SIZE):
+        self.queryset = queryset.order_by(*ordering)
+        self.fields = [field.lstrip("-") for field in ordering]
+        self.descending = ordering[0].startswith("-")
+        self.per_page = per_page
+
+    def encode(self, obj):
+        values = [getattr(obj, field) for field in self.fields]
+        data = json.dumps(values, default=lambda value: value.isoformat()).encode()
+        return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+    def decode(self, cursor):
+        opts = self.queryset.model._meta
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            if not isinstance(values, list) or len(values) != len(self.fields):
+                raise ValueError
+            return [
+                (opts.pk if field == "pk" else opts.get_field(field)).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            raise Http404("Invalid cursor")
+
+    def after(self, cursor):
+        queryset = self.queryset
+        if cursor:
+            values = self.decode(cursor)
+            lookup = "lt" if self.descending else "gt"
+            condition = Q()
+            for i, field in enumerate(self.fields):
+                equal = dict(zip(self.fields[:i], values[:i]))
+                condition |= Q(**equal, **{f"{field}__{lookup}": values[i]})
+            queryset = queryset.filter(condition)
+        return queryset[:self.per_page + 1]
+
+    def page(self, cursor=None):
+        return self.paginate(list(self.after(cursor)))
+
+    async def apage(self, cursor=None):
+        return self.paginate([obj async for obj in self.after(cursor)])
+
+    def paginate(self, rows):
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            return KeysetPage(rows, self.encode(rows[-1]))
+        return KeysetPage(rows, None)
@@ -0,0 +1,129 @@
+import hashlib
+import re
+import struct
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import DocumentSignature, PlagiarismCheck, PlagiarismMatch, SignatureBucket
+
+
+SHINGLE_SIZE = 5
+NUM_HASHES = 128
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+EMPTY = (1 << 64) - 1
+CANDIDATE_LIMIT = 50
+MATCH_THRESHOLD = 0.1
+
+WORD_RE = re.compile(r"\w+")
+SIGNATURE_FORMAT = f"<{NUM_HASHES}Q"
+
+
+def hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def shingle_hashes(paragraphs):
+    words = [word for paragraph in paragraphs for word in WORD_RE.findall(paragraph.lower())]
+    for i in range(max(len(words) - SHINGLE_SIZE + 1, 0)):
+        yield hash64(" ".join(words[i:i + SHINGLE_SIZE]).encode())
+
+
+def minhash(hashes):
+    # One permutation hashing: a single hash per shingle is split into a bin
+    # and a value and every bin keeps its minimum. This gives NUM_HASHES
+    # MinHash slots for the price of one hash, which keeps signing a whole
+    # thesis well under a second.
+    slots = [EMPTY] * NUM_HASHES
+    count = 0
+    for value in hashes:
+        count += 1
+        slot, rest = value % NUM_HASHES, value // NUM_HASHES
+        if rest < slots[slot]:
+            slots[slot] = rest
+    if count == 0:
+        return None, 0
+
+    # Densify empty bins by borrowing from the next filled bin so short
+    # documents still produce comparable signatures.
+    filled = [i for i, value in enumerate(slots) if value != EMPTY]
+    for i in range(NUM_HASHES):
+        if slots[i] == EMPTY:
+            donor = next((j for j in filled if j > i), filled[0])
+            slots[i] = slots[donor] + (donor - i) % NUM_HASHES
+    return slots, count
+
+
+def bucket_keys(slots):
+    keys = []
+    for band in range(BANDS):
+        rows = slots[band * ROWS:(band + 1) * ROWS]
+        # BigIntegerField is signed, so fold the hash into 63 bits.
+        keys.append(hash64(struct.pack(f"<H{ROWS}Q", band, *rows)) >> 1)
+    return keys
+
+
+def similarity(first, second):
+    return sum(a == b for a, b in zip(first, second)) / NUM_HASHES
+
+
+def unpack(signature):
+    return struct.unpack(SIGNATURE_FORMAT, bytes(signature.signature))
+
+
+def index_document(document):
+    try:
+        slots, count = minhash(shingle_hashes(document.text.paragraph_list()))
+    except FileNotFoundError:
+        slots = None
+    if slots is None:
+        return None
+
+    with transaction.atomic():
+        signature, _ = DocumentSignature.objects.update_or_create(
+            document=document,
+            defaults={"signature": struct.pack(SIGNATURE_FORMAT, *slots), "shingle_count": count},
+        )
+        signature.buckets.all().delete()
+        SignatureBucket.objects.bulk_create(
+            SignatureBucket(signature=signature, key=key) for key in bucket_keys(slots)
+        )
+    return signature
+
+
+def find_similar(document, limit=10):
+    signature = DocumentSignature.objects.filter(document=document).first() or index_document(document)
+    if signature is None:
+        return []
+
+    slots = unpack(signature)
+    candidates = SignatureBucket.objects.filter(key__in=bucket_keys(slots)).exclude(signature=signature)
+    if document.project_id:
+        # Earlier versions of the same thesis are expected to match.
+        candidates = candidates.exclude(signature__document__project=document.project_id)
+    candidates = candidates.values("signature").annotate(hits=Count("id")).order_by("-hits")[:CANDIDATE_LIMIT]
+
+    matches = []
+    for candidate in DocumentSignature.objects.filter(pk__in=[row["signature"] for row in candidates]):
+        score = similarity(slots, unpack(candidate))
+        if score >= MATCH_THRESHOLD:
+            matches.append((candidate.document_id, score))
+    matches.sort(key=lambda match: match[1], reverse=True)
+    return matches[:limit]
+
+
+def run_check(project, user):
+    document = project.final_version or project.latest_document
+    matches = find_similar(document) if document else []
+
+    if matches:
+        comment = f"{len(matches)} similar documents found, highest similarity {matches[0][1]:.0%}."
+    else:
+        comment = "No similar documents found."
+    check = PlagiarismCheck.objects.create(project=project, user=user, comment=comment)
+    PlagiarismMatch.objects.bulk_create(
+        PlagiarismMatch(plagiarism_check=check, document_id=document_id, similarity=score)
+        for document_id, score in matches
+    )
+    return check
@@ -0,0 +1,82 @@
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+
+from .models import DocumentPreview, PreviewPage
+from .storage import file_digest
+
+
+class ConversionError(Exception):
+    pass
+
+
+def run(command, workdir):
+    timeout = getattr(settings, "EGRADU_PREVIEW_TIMEOUT", 120)
+    try:
+        subprocess.run(command, cwd=workdir, check=True, capture_output=True, timeout=timeout)
+    except subprocess.CalledProcessError as error:
+        raise ConversionError(error.stderr.decode(errors="replace") or f"{command[0]} exited with {error.returncode}")
+    except subprocess.TimeoutExpired:
+        raise ConversionError(f"{command[0]} did not finish in {timeout} seconds")
+
+
+def convert_to_pdf(path, workdir):
+    if path.lower().endswith(".pdf"):
+        return path
+    # Every conversion gets its own LibreOffice profile, instances sharing one
+    # refuse to start, which would serialise the worker pool.
+    profile = Path(workdir, "profile").as_uri()
+    run([
+        getattr(settings, "EGRADU_PREVIEW_CONVERTER", "soffice"),
+        f"-env:UserInstallation={profile}",
+        "--headless", "--convert-to", "pdf", "--outdir", workdir, path,
+    ], workdir)
+    pdf = os.path.join(workdir, os.path.splitext(os.path.basename(path))[0] + ".pdf")
+    if not os.path.exists(pdf):
+        raise ConversionError("The converter did not produce a PDF")
+    return pdf
+
+
+def render_pages(pdf, workdir):
+    pages = getattr(settings, "EGRADU_PREVIEW_PAGES", 3)
+    run([
+        getattr(settings, "EGRADU_PREVIEW_RASTERIZER", "pdftoppm"),
+        "-png", "-f", "1", "-l", str(pages),
+        "-scale-to", str(getattr(settings, "EGRADU_PREVIEW_WIDTH", 480)),
+        pdf, os.path.join(workdir, "page"),
+    ], workdir)
+    # pdftoppm pads the page number to the width of the last page number.
+    return sorted(Path(workdir).glob("page-*.png"), key=lambda image: int(image.stem.rsplit("-", 1)[1]))
+
+
+def render(field_file):
+    digest = file_digest(field_file)
+    DocumentPreview.objects.get_or_create(digest=digest)
+    # Jobs for other uploads of the same file wait on the row lock here and
+    # then find the finished preview instead of converting it again.
+    preview = DocumentPreview.objects.select_for_update().get(digest=digest)
+    if preview.pdf or preview.error:
+        return preview
+
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            pdf = convert_to_pdf(field_file.path, workdir)
+            images = render_pages(pdf, workdir)
+        except ConversionError as error:
+            preview.error = str(error)
+            preview.save(update_fields=["error"])
+            return preview
+
+        with open(pdf, "rb") as file:
+            preview.pdf.save(f"{digest[:16]}.pdf", File(file), save=False)
+        preview.save(update_fields=["pdf"])
+        for number, image in enumerate(images, 1):
+            page = PreviewPage(preview=preview, number=number)
+            with open(image, "rb") as file:
+                page.image.save(f"{digest[:16]}-{number}.png", File(file), save=False)
+            page.save()
+    return preview
@@ -0,0 +1,48 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Project, UserType
+
+
+@dataclass(frozen=True)
+class Roles:
+    is_student: bool = False
+    is_teacher: bool = False
+    project_id: Optional[int] = None
+
+    @property
+    def has_project(self):
+        return self.project_id is not None
+
+
+def roles_cache_key(user_id):
+    return f"egradu:roles:{user_id}"
+
+
+def resolve_roles(user):
+    if not user.is_authenticated:
+        return Roles()
+
+    key = roles_cache_key(user.pk)
+    roles = cache.get(key)
+    if roles is None:
+        identifiers = set(UserType.objects.filter(contact__user=user).values_list("identifier", flat=True))
+        roles = Roles(
+            is_student="student" in identifiers,
+            is_teacher="teacher" in identifiers,
+            project_id=Project.objects.filter(student=user).values_list("id", flat=True).first(),
+        )
+        cache.set(key, roles, getattr(settings, "EGRADU_ROLES_CACHE_TIMEOUT", 3600))
+    return roles
+
+
+def invalidate_roles(*user_ids):
+    # Deferred until commit, like invalidate_sections, so a request running in
+    # the meantime cannot cache the roles as they were before this transaction.
+    keys = [roles_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,90 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Substr
+
+from .models import DocumentText, SearchEntry, SearchKind
+
+
+SEARCH_CONFIG = "simple"
+FTS_TABLE = "egradu_searchentry_fts"
+TOKEN_RE = re.compile(r"\w+")
+
+
+def index_document(document):
+    # Abstracts and thesis text go through the DocumentText cache, so
+    # re-indexing an unchanged file does not parse it again.
+    for kind, field_file in ((SearchKind.DOCUMENT, document.file), (SearchKind.ABSTRACT, document.abstract)):
+        if not field_file:
+            SearchEntry.objects.filter(document=document, kind=kind).delete()
+            continue
+        SearchEntry.objects.update_or_create(
+            document=document, kind=kind, comment=None,
+            defaults={"body": DocumentText.objects.for_file(field_file).text},
+        )
+
+
+def index_comment(comment):
+    SearchEntry.objects.update_or_create(
+        comment=comment,
+        defaults={"document_id": comment.document_id, "kind": SearchKind.COMMENT, "body": comment.comment},
+    )
+
+
+class FTS5Results:
+    # Paginator only needs count() and slicing, so SQLite FTS5 results are
+    # fetched one page at a time with LIMIT/OFFSET.
+    def __init__(self, query):
+        self.match = " ".join('"%s"' % token for token in TOKEN_RE.findall(query))
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [self.match])
+            return cursor.fetchone()[0]
+
+    def __getitem__(self, page):
+        if not self.match:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({FTS_TABLE}, 0, '', '', '…', 24) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s ORDER BY bm25({FTS_TABLE}) LIMIT %s OFFSET %s",
+                [self.match, page.stop - page.start, page.start],
+            )
+            rows = cursor.fetchall()
+        entries = SearchEntry.objects.select_related("document__project__student", "comment__user").in_bulk(
+            [rowid for rowid, _ in rows]
+        )
+        results = []
+        for rowid, snippet in rows:
+            entry = entries[rowid]
+            entry.snippet = snippet
+            results.append(entry)
+        return results
+
+
+def search(query):
+    entries = SearchEntry.objects.select_related("document__project__student", "comment__user")
+
+    if connection.vendor == "postgresql":
+        from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+
+        # Matches the GIN expression index created in migration 0012.
+        vector = SearchVector("body", config=SEARCH_CONFIG)
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+        return entries.annotate(
+            search=vector,
+            rank=SearchRank(vector, search_query),
+            snippet=SearchHeadline("body", search_query, config=SEARCH_CONFIG, max_words=24, min_words=12),
+        ).filter(search=search_query).order_by("-rank", "pk")
+
+    if connection.vendor == "sqlite":
+        return FTS5Results(query)
+
+    condition = Q()
+    for token in TOKEN_RE.findall(query):
+        condition &= Q(body__icontains=token)
+    return entries.filter(condition).annotate(snippet=Substr("body", 1, 200)).order_by("pk") if condition else entries.none()
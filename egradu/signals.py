@@ -0,0 +1,145 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import history, notifications
+from .fragments import DRAFTS, PLAGIARISM, REVIEWS, SUPERVISOR_SECTIONS, invalidate_sections
+from .jobs import enqueue
+from .models import Contact, Document, DocumentComments, DocumentPreview, Evaluation, PreviewPage, Project
+from .roles import invalidate_roles
+from .search import index_comment
+from .storage import ContentAddressedStorage, document_storage
+
+
+@receiver(m2m_changed, sender=Contact.types.through)
+def contact_types_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        invalidate_roles(instance.user_id)
+    elif action == "pre_clear":
+        invalidate_roles(*instance.contact_set.values_list("user_id", flat=True))
+    else:
+        invalidate_roles(*Contact.objects.filter(pk__in=pk_set).values_list("user_id", flat=True))
+
+
+@receiver(post_delete, sender=Contact)
+def contact_deleted(sender, instance, **kwargs):
+    invalidate_roles(instance.user_id)
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        invalidate_roles(instance.student_id)
+    if update_fields is None or "status" in update_fields:
+        # Instances not loaded from the database have no known previous status.
+        previous = None if created else getattr(instance, "_saved_status", None)
+        if created or previous not in (None, instance.status):
+            history.record([(instance.pk, instance.supervisor_id, previous, instance.status)])
+            notifications.status_changed([(instance.pk, instance.supervisor_id, instance.status)])
+        instance._saved_status = instance.status
+    invalidate_sections([instance.supervisor_id], *SUPERVISOR_SECTIONS)
+
+
+@receiver(pre_delete, sender=Project)
+def project_deleting(sender, instance, **kwargs):
+    # The reviewer rows are gone by post_delete and cascades send no
+    # m2m_changed.
+    invalidate_sections(instance.reviewers.values_list("pk", flat=True), REVIEWS)
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted(sender, instance, **kwargs):
+    invalidate_roles(instance.student_id)
+    invalidate_sections([instance.supervisor_id], *SUPERVISOR_SECTIONS)
+
+
+@receiver(m2m_changed, sender=Project.reviewers.through)
+def project_reviewers_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if reverse:
+        invalidate_sections([instance.pk], REVIEWS)
+    elif action == "pre_clear":
+        invalidate_sections(instance.reviewers.values_list("pk", flat=True), REVIEWS)
+    else:
+        invalidate_sections(pk_set, REVIEWS)
+
+
+@receiver([post_save, post_delete], sender=Evaluation)
+def evaluation_changed(sender, instance, **kwargs):
+    invalidate_sections([instance.user_id], REVIEWS)
+
+
+def invalidate_document_sections(document):
+    supervisors = Project.objects.filter(pk=document.project_id).values_list("supervisor", flat=True)
+    invalidate_sections(supervisors, DRAFTS, PLAGIARISM)
+
+
+@receiver(post_save, sender=Document)
+def document_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Only a new or replaced file needs re-indexing, not draft/timestamp updates.
+    if created or (update_fields and {"file", "abstract"} & set(update_fields)):
+        enqueue("search.index_document", unique=True, document_id=instance.pk)
+    if created or (update_fields and "file" in update_fields):
+        enqueue("preview.render", unique=True, document_id=instance.pk)
+    if created:
+        notifications.document_uploaded(instance)
+    invalidate_document_sections(instance)
+
+
+@receiver(post_delete, sender=Document)
+def document_deleted(sender, instance, **kwargs):
+    Project.objects.filter(pk=instance.project_id).refresh_documents()
+    invalidate_document_sections(instance)
+
+
+@receiver(post_save, sender=DocumentComments)
+def comment_saved(sender, instance, created, **kwargs):
+    index_comment(instance)
+    if created:
+        notifications.comment_added(instance)
+
+
+def release_files(names):
+    # Drops the references taken when the files were stored, once the rows
+    # that pointed at them are gone for good. Files stored before blobs were
+    # counted have no reference to drop and are left alone.
+    names = [name for name in names if ContentAddressedStorage.digest(name)]
+
+    def release():
+        storage = document_storage()
+        for name in names:
+            storage.delete(name)
+
+    if names:
+        transaction.on_commit(release)
+
+
+def stored_names(instance):
+    return {name: getattr(instance, name).name or None for name in instance.stored_files}
+
+
+@receiver(post_save, sender=Document)
+@receiver(post_save, sender=DocumentComments)
+@receiver(post_save, sender=DocumentPreview)
+@receiver(post_save, sender=PreviewPage)
+def stored_files_saved(sender, instance, update_fields=None, **kwargs):
+    saved = getattr(instance, "_saved_files", {})
+    replaced = []
+    for field, name in stored_names(instance).items():
+        if update_fields is None or field in update_fields:
+            if saved.get(field) not in (None, name):
+                replaced.append(saved[field])
+            saved[field] = name
+    instance._saved_files = saved
+    release_files(replaced)
+
+
+@receiver(post_delete, sender=Document)
+@receiver(post_delete, sender=DocumentComments)
+@receiver(post_delete, sender=DocumentPreview)
+@receiver(post_delete, sender=PreviewPage)
+def stored_files_deleted(sender, instance, **kwargs):
+    release_files(name for name in stored_names(instance).values() if name)
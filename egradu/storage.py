@@ -0,0 +1,109 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{2}/([0-9a-f]{64})/")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Every blob is stored once as <digest[:2]>/<digest>/<first upload name>.
+    # Uploading identical bytes again returns the existing name and bumps the
+    # blob's reference count in the Blob table instead of writing a new file.
+    max_name_length = 255
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from the content in _save, so they never collide.
+        return name
+
+    def _save(self, name, content):
+        from .models import Blob
+
+        if getattr(content, "sha256", None) and hasattr(content, "temporary_file_path"):
+            # Already hashed while it was received, see egradu.uploads.
+            digest, size, temp_path = content.sha256, content.size, None
+        else:
+            digest, size, temp_path = self._spool(content)
+        prefix = f"{digest[:2]}/{digest}/"
+        stem, ext = os.path.splitext(os.path.basename(name))
+        name = prefix + stem[:self.max_name_length - len(prefix) - len(ext)] + ext
+
+        blob, created = Blob.objects.get_or_create(digest=digest, defaults={"name": name, "size": size})
+        path = self.path(blob.name)
+        if os.path.exists(path):
+            if temp_path:
+                os.unlink(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if temp_path:
+                os.replace(temp_path, path)
+            else:
+                self._link(content.temporary_file_path(), path)
+            if self.file_permissions_mode is not None:
+                os.chmod(path, self.file_permissions_mode)
+        Blob.objects.filter(pk=blob.pk).update(references=F("references") + 1)
+        return blob.name
+
+    def incoming_path(self):
+        # Scratch space on the same filesystem as the blobs so that finished
+        # files can be moved or linked into place instead of copied.
+        incoming = self.path(".incoming")
+        os.makedirs(incoming, exist_ok=True)
+        return incoming
+
+    def _link(self, source, path):
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copyfile(source, path)
+
+    def _spool(self, content):
+        # Hash while copying to a temporary file next to the final location so
+        # that the upload is never held in memory and the move is atomic.
+        incoming = self.incoming_path()
+        sha256 = hashlib.sha256()
+        size = 0
+        if hasattr(content, "seek"):
+            content.seek(0)
+        with tempfile.NamedTemporaryFile(dir=incoming, delete=False) as temp:
+            for chunk in content.chunks():
+                sha256.update(chunk)
+                temp.write(chunk)
+                size += len(chunk)
+        return sha256.hexdigest(), size, temp.name
+
+    def delete(self, name):
+        from .models import Blob
+
+        blob = Blob.objects.filter(name=name).first()
+        if blob is None:
+            return super().delete(name)
+
+        Blob.objects.filter(pk=blob.pk).update(references=F("references") - 1)
+        if Blob.objects.filter(pk=blob.pk, references__lte=0).delete()[0]:
+            super().delete(name)
+
+    @staticmethod
+    def digest(name):
+        match = DIGEST_RE.match(name or "")
+        return match.group(1) if match else None
+
+
+def document_storage():
+    return ContentAddressedStorage()
+
+
+def file_digest(field_file):
+    digest = ContentAddressedStorage.digest(field_file.name)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with field_file.open("rb") as file:
+            for chunk in file.chunks():
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+    return digest
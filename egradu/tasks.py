@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+
+from .jobs import job
+from .models import Document, DocumentStatus, Project
+from .plagiarism import index_document, run_check
+from . import diff, previews, search
+
+
+User = get_user_model()
+
+
+def mark_plagiarism_ongoing(project_id, user_id):
+    # A retried job finds the project already ongoing. A project that has
+    # moved on since the job was queued is left alone.
+    project = Project.objects.select_for_update().get(pk=project_id)
+    if project.status == DocumentStatus.PENDING_PLAGIARISM:
+        project.status = DocumentStatus.PLAGIARISM_ONGOING
+        project.save(update_fields=["status"])
+
+
+@job("plagiarism.check", on_claim=mark_plagiarism_ongoing)
+def check_plagiarism(project_id, user_id):
+    project = Project.objects.get(pk=project_id)
+    if project.status == DocumentStatus.PLAGIARISM_ONGOING:
+        run_check(project, User.objects.get(pk=user_id))
+
+
+@job("plagiarism.index")
+def index_for_plagiarism(document_id):
+    document = Document.objects.filter(pk=document_id).first()
+    if document:
+        index_document(document)
+
+
+@job("search.index_document")
+def index_for_search(document_id):
+    document = Document.objects.filter(pk=document_id).first()
+    if document:
+        search.index_document(document)
+
+
+@job("preview.render")
+def render_preview(document_id):
+    document = Document.objects.filter(pk=document_id).first()
+    if document:
+        previews.render(document.file)
+
+
+@job("diff.compute")
+def compute_diff(old_document_id, new_document_id):
+    documents = Document.objects.in_bulk([old_document_id, new_document_id])
+    if len(documents) == 2:
+        diff.get_diff(documents[old_document_id], documents[new_document_id])
@@ -1,3 +1,1143 @@
-from django.test import TestCase
+import csv
+import hashlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from django.utils.timezone import localdate, now
+
+from . import cohort, history, jobs, metrics, plagiarism, search
+from .files import serve_file
+from .jobs import run_next
+from .loadtest import odt_bytes
+from .models import (
+    Blob, Contact, Document, DocumentComments, DocumentPreview, LastDocumentVisit, DocumentStatus, Evaluation, Grade, Job, JobStatus, LanguageCheck, PlagiarismCheck,
+    Notification, PreviewPage, Project, StatusDay, StatusTransition, UserType,
+)
+from .odt import extract_text, iter_paragraphs
+from .pagination import KeysetPaginator
+from .roles import Roles, resolve_roles
+from .storage import document_storage
+from .transitions import bulk_transition
+from .views import supervisor_projects
+
+
+User = get_user_model()
+
+
+def create_supervisor_fixture(name, size):
+    supervisor = User.objects.create(username=name)
+    students = User.objects.bulk_create(
+        User(username=f"{name}-student-{i}") for i in range(size)
+    )
+    statuses = (
+        DocumentStatus.DRAFT,
+        DocumentStatus.LANGUAGE_CHECK,
+        DocumentStatus.PENDING_PLAGIARISM,
+        DocumentStatus.EVALUATION,
+    )
+    projects = Project.objects.bulk_create(
+        Project(student=student, supervisor=supervisor, status=statuses[i % len(statuses)])
+        for i, student in enumerate(students)
+    )
+    Document.objects.bulk_create(
+        Document(project=project, file=f"{project.student.username}.odt", latest_update=now())
+        for project in projects
+    )
+    # The supervisor also reviews someone else's project in every fixture.
+    Project.reviewers.through.objects.bulk_create(
+        Project.reviewers.through(project=project, user=supervisor)
+        for project in projects[:size // 10]
+    )
+    return supervisor
+
+
+class ReadStateTest(TestCase):
+    def setUp(self):
+        supervisor = create_supervisor_fixture("read-state", 1)
+        self.user = supervisor
+        self.document = Document.objects.get(project__supervisor=supervisor)
+
+    def unread(self):
+        return Document.objects.filter(pk=self.document.pk).with_read_state(self.user).get().update
+
+    def test_touch_marks_the_document_read(self):
+        self.assertTrue(self.unread())
+        LastDocumentVisit.objects.touch(self.document, self.user)
+        self.assertFalse(self.unread())
+        self.assertEqual(LastDocumentVisit.objects.filter(document=self.document, user=self.user).count(), 1)
+
+    def test_coalesced_touch_skips_only_cursors_past_the_latest_update(self):
+        LastDocumentVisit.objects.touch(self.document, self.user)
+        visit = LastDocumentVisit.objects.get(document=self.document, user=self.user)
+
+        # Only the cursor is read, nothing is written.
+        with self.assertNumQueries(1), CaptureQueriesContext(connection) as queries:
+            LastDocumentVisit.objects.touch(self.document, self.user)
+        self.assertTrue(queries[0]["sql"].startswith("SELECT"))
+        self.assertEqual(LastDocumentVisit.objects.get(pk=visit.pk).time, visit.time)
+
+        # A comment within the coalescing window still has to be seen.
+        self.document.latest_update = now()
+        self.document.save()
+        self.assertTrue(self.unread())
+        LastDocumentVisit.objects.touch(self.document, self.user)
+        self.assertFalse(self.unread())
+
+
+class CompactVisitsMigrationTest(TransactionTestCase):
+    migrate_from = [("egradu", "0006_lastdocumentvisit_doc_user_time")]
+    migrate_to = [("egradu", "0007_compact_lastdocumentvisit")]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_keeps_the_latest_visit_per_document_and_user(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+        user = apps.get_model("auth", "User").objects.create(username="compact")
+        Document = apps.get_model("egradu", "Document")
+        Visit = apps.get_model("egradu", "LastDocumentVisit")
+        first, second = Document.objects.create(file="a.odt"), Document.objects.create(file="b.odt")
+        for document in (first, first, first, second):
+            Visit.objects.create(document=document, user=user)
+        latest = Visit.objects.filter(document=first).order_by("-id").first().id
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        Visit = executor.loader.project_state(self.migrate_to).apps.get_model("egradu", "LastDocumentVisit")
+        self.assertEqual(
+            sorted(Visit.objects.values_list("id", flat=True)),
+            sorted([latest, Visit.objects.get(document=second.pk).id]),
+        )
+
+
+class TeacherIndexQueryBudgetTest(TestCase):
+    expected_queries = 8
+
+    def setUp(self):
+        # Cached roles outlive the rolled back users of earlier tests, whose
+        # primary keys get reused.
+        cache.clear()
+
+    def get_teacher_index(self, supervisor):
+        self.client.force_login(supervisor)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("teacher_index"))
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_scale_with_projects(self):
+        counts = {}
+        for size in (10, 100, 1000):
+            with self.subTest(size=size):
+                supervisor = create_supervisor_fixture(f"supervisor-{size}", size)
+                response, counts[size] = self.get_teacher_index(supervisor)
+                self.assertContains(response, f"supervisor-{size}-student-0")
+                self.assertEqual(counts[size], self.expected_queries)
+
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+
+class BlobReferenceTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.project = Project.objects.get(supervisor=create_supervisor_fixture("blob", 1))
+
+    def upload(self, content, name="thesis.odt"):
+        document = Document(project=self.project)
+        document.file.save(name, ContentFile(content))
+        return Document.objects.get(pk=document.pk)
+
+    def test_identical_uploads_share_one_blob_until_both_are_deleted(self):
+        first, second = self.upload(b"same bytes"), self.upload(b"same bytes", "copy.odt")
+        self.assertEqual(first.file.name, second.file.name)
+        blob = Blob.objects.get(name=first.file.name)
+        self.assertEqual(blob.references, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(Blob.objects.get(pk=blob.pk).references, 1)
+        self.assertTrue(document_storage().exists(blob.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Blob.objects.filter(pk=blob.pk).exists())
+        self.assertFalse(document_storage().exists(blob.name))
+
+    def test_replaced_and_cascaded_files_are_released(self):
+        document = self.upload(b"first version")
+        old = document.file.name
+        comment = DocumentComments(document=document, user=self.project.supervisor, comment="See notes")
+        comment.commented_document.save("notes.odt", ContentFile(b"notes"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            document.file.save("thesis.odt", ContentFile(b"second version"))
+        self.assertFalse(Blob.objects.filter(name=old).exists())
+        self.assertEqual(Blob.objects.get(name=document.file.name).references, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            document.delete()
+        self.assertFalse(Blob.objects.exists())
+
+    def test_deleted_previews_release_their_files(self):
+        preview = DocumentPreview.objects.create(digest="0" * 64)
+        preview.pdf.save("preview.pdf", ContentFile(b"pdf"))
+        page = PreviewPage(preview=preview, number=1)
+        page.image.save("preview-1.png", ContentFile(b"png"))
+        names = [preview.pdf.name, page.image.name]
+        self.assertEqual(Blob.objects.filter(name__in=names).count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DocumentPreview.objects.get(pk=preview.pk).delete()
+        self.assertFalse(Blob.objects.exists())
+        self.assertFalse(any(document_storage().exists(name) for name in names))
+
+
+class ServeFileTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.document = Document(project=Project.objects.get(supervisor=create_supervisor_fixture("serve", 1)))
+        self.document.file.save("thesis.odt", ContentFile(b"0123456789"))
+        self.modified = now().replace(microsecond=0) - timedelta(days=1)
+
+    def serve(self, **headers):
+        response = serve_file(RequestFactory().get("/", headers=headers), self.document.file, last_modified=self.modified)
+        self.addCleanup(response.close)
+        return response
+
+    def content(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_full_file(self):
+        response = self.serve()
+        self.assertEqual((response.status_code, response["Content-Length"]), (200, "10"))
+        self.assertEqual(self.content(response), b"0123456789")
+
+    def test_single_and_suffix_ranges(self):
+        response = self.serve(Range="bytes=2-5")
+        self.assertEqual((response.status_code, response["Content-Range"]), (206, "bytes 2-5/10"))
+        self.assertEqual(self.content(response), b"2345")
+
+        response = self.serve(Range="bytes=-3")
+        self.assertEqual((response.status_code, response["Content-Range"]), (206, "bytes 7-9/10"))
+        self.assertEqual(self.content(response), b"789")
+
+        self.assertEqual(self.content(self.serve(Range="bytes=8-")), b"89")
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(Range="bytes=10-20")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, "bytes */10"))
+
+    def test_stale_if_range_serves_the_whole_file(self):
+        etag = self.serve()["ETag"]
+        self.assertEqual(self.serve(Range="bytes=2-5", **{"If-Range": etag}).status_code, 206)
+        response = self.serve(Range="bytes=2-5", **{"If-Range": '"stale"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), b"0123456789")
+        earlier = http_date((self.modified - timedelta(hours=1)).timestamp())
+        self.assertEqual(self.serve(Range="bytes=2-5", **{"If-Range": earlier}).status_code, 200)
+
+    def test_conditional_requests_are_not_modified(self):
+        etag = self.serve()["ETag"]
+        self.assertEqual(self.serve(**{"If-None-Match": etag}).status_code, 304)
+        self.assertEqual(self.serve(**{"If-None-Match": '"other"'}).status_code, 200)
+        since = http_date(self.modified.timestamp())
+        self.assertEqual(self.serve(**{"If-Modified-Since": since}).status_code, 304)
+        earlier = http_date((self.modified - timedelta(hours=1)).timestamp())
+        self.assertEqual(self.serve(**{"If-Modified-Since": earlier}).status_code, 200)
+
+
+class OdtExtractionTest(SimpleTestCase):
+    def odt(self, content):
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("mimetype", "application/vnd.oasis.opendocument.text")
+            if content is not None:
+                archive.writestr("content.xml", content)
+        buffer.seek(0)
+        return buffer
+
+    def test_paragraphs_headings_and_spacing(self):
+        content = (
+            '<office:document-content xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0" '
+            'xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"><office:body><office:text>'
+            '<text:h>Introduction</text:h>'
+            '<text:p>Two<text:s text:c="2"/>spaces,<text:tab/>a tab and <text:span>a span</text:span>.</text:p>'
+            '<text:p> </text:p>'
+            '<text:p>First line<text:line-break/>second line</text:p>'
+            '</office:text></office:body></office:document-content>'
+        )
+        text, offsets, word_count = extract_text(self.odt(content))
+        self.assertEqual(
+            text, "Introduction\n\nTwo  spaces,\ta tab and a span.\n\nFirst line\nsecond line",
+        )
+        self.assertEqual(offsets, [0, 14, 46])
+        self.assertEqual(word_count, 12)
+
+    def test_malformed_files_extract_no_text(self):
+        for file in (
+            BytesIO(b"not a zip file"),
+            self.odt(None),
+            self.odt("<office:document-content><text:p>unclosed"),
+            self.odt('<p xmlns="urn:oasis:names:tc:opendocument:xmlns:text:1.0">unclosed'),
+        ):
+            with self.subTest(file=file):
+                self.assertEqual(extract_text(file), ("", [], 0))
+                file.seek(0)
+                with self.assertRaises(ValueError):
+                    list(iter_paragraphs(file))
+
+
+class PlagiarismTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.projects = list(Project.objects.filter(supervisor=create_supervisor_fixture("plagiarism", 3)).order_by("pk"))
+
+    def words(self, seed, count=600):
+        generator = random.Random(seed)
+        return [f"w{generator.randrange(5000)}" for _ in range(count)]
+
+    def upload(self, project, words):
+        document = Document(project=project)
+        paragraphs = [" ".join(words[i:i + 60]) for i in range(0, len(words), 60)]
+        document.file.save("thesis.odt", ContentFile(odt_bytes(paragraphs)))
+        Project.objects.filter(pk=project.pk).refresh_documents()
+        plagiarism.index_document(document)
+        return document
+
+    def test_near_duplicates_match_and_unrelated_texts_do_not(self):
+        words = self.words(seed=1)
+        original = self.upload(self.projects[0], words)
+        copy = self.upload(self.projects[1], [f"changed{i}" if i % 40 == 0 else word for i, word in enumerate(words)])
+        self.upload(self.projects[2], self.words(seed=2))
+
+        matches = plagiarism.find_similar(copy)
+        self.assertEqual([document_id for document_id, _ in matches], [original.pk])
+        self.assertGreater(matches[0][1], 0.5)
+
+        copied, unrelated = Project.objects.filter(pk__in=[self.projects[1].pk, self.projects[2].pk]).order_by("pk")
+        check = plagiarism.run_check(copied, copied.supervisor)
+        self.assertEqual(list(check.matches.values_list("document", flat=True)), [original.pk])
+        self.assertFalse(plagiarism.run_check(unrelated, unrelated.supervisor).matches.exists())
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+        project = Project.objects.get(supervisor=create_supervisor_fixture("search", 1))
+        self.document = Document(project=project)
+        self.document.file.save("thesis.odt", ContentFile(odt_bytes(["Photosynthesis in boreal forests."])))
+        search.index_document(self.document)
+        self.comment = DocumentComments.objects.create(
+            document=self.document, user=project.supervisor, comment="Cite the lichen studies.",
+        )
+
+    def results(self, query):
+        results = search.search(query)
+        return results.count(), list(results[0:20])
+
+    def test_search_view_finds_documents_and_comments(self):
+        self.client.force_login(User.objects.create(username="search-staff", is_staff=True))
+        response = self.client.get(reverse("search"), {"q": "photosynthesis"})
+        entries = list(response.context["page_obj"])
+        self.assertEqual([(entry.document, entry.comment) for entry in entries], [(self.document, None)])
+        self.assertIn("boreal", entries[0].snippet)
+
+        response = self.client.get(reverse("search"), {"q": "lichen studies"})
+        self.assertEqual([entry.comment for entry in response.context["page_obj"]], [self.comment])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.comment.comment = "Cite the moss studies."
+        self.comment.save()
+        self.assertEqual(self.results("lichen"), (0, []))
+        count, entries = self.results("moss")
+        self.assertEqual((count, [entry.comment for entry in entries]), (1, [self.comment]))
+
+        self.comment.delete()
+        self.assertEqual(self.results("moss"), (0, []))
+        self.assertEqual(self.results("boreal")[0], 1)
+
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+        self.supervisor = User.objects.create(username="async-supervisor")
+        self.student = User.objects.create(username="async-student")
+        for user, identifier in ((self.supervisor, "teacher"), (self.student, "student")):
+            Contact.objects.create(user=user).types.add(UserType.objects.create(name=identifier, identifier=identifier))
+        self.project = Project.objects.create(student=self.student, supervisor=self.supervisor)
+        self.document = Document(project=self.project)
+        self.document.file.save("thesis.odt", ContentFile(b"thesis"))
+        Project.objects.filter(pk=self.project.pk).refresh_documents()
+
+    async def test_anonymous_requests_are_sent_to_login(self):
+        for url in (
+            reverse("student_index"),
+            reverse("teacher_index"),
+            reverse("document", args=[self.document.pk]),
+            reverse("document_download", args=[self.document.pk]),
+        ):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 302)
+                self.assertEqual(response.url, f"/login/?next={url}")
+
+    async def test_roles_are_resolved_for_each_user(self):
+        await sync_to_async(self.async_client.force_login)(self.student)
+        response = await self.async_client.get(reverse("index"))
+        self.assertEqual(response.url, reverse("student_index"))
+        response = await self.async_client.get(reverse("student_index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["document"], self.document)
+        self.assertEqual(response.asgi_request.egradu_roles, Roles(is_student=True, project_id=self.project.pk))
+        response = await self.async_client.get(reverse("document_download", args=[self.document.pk]))
+        self.assertEqual(b"".join([chunk async for chunk in response.streaming_content]), b"thesis")
+
+        await sync_to_async(self.async_client.force_login)(self.supervisor)
+        response = await self.async_client.get(reverse("index"))
+        self.assertEqual(response.url, reverse("teacher_index"))
+        response = await self.async_client.get(reverse("teacher_index"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.asgi_request.egradu_roles, Roles(is_teacher=True))
+        self.assertContains(response, "async-student")
+
+
+class PlagiarismCheckJobTest(TestCase):
+    def setUp(self):
+        supervisor = create_supervisor_fixture("plagiarism-job", 3)
+        self.project = Project.objects.get(supervisor=supervisor, status=DocumentStatus.PENDING_PLAGIARISM)
+        self.client.force_login(supervisor)
+
+    def status(self):
+        return Project.objects.get(pk=self.project.pk).status
+
+    def test_only_pending_projects_are_sent_and_checked_once(self):
+        url = reverse("start_plagiarism", args=[self.project.pk])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(Job.objects.filter(name="plagiarism.check").count(), 1)
+        run_next()
+        self.assertEqual(self.status(), DocumentStatus.PLAGIARISM_ONGOING)
+        self.assertEqual(self.project.plagiarismcheck_set.count(), 1)
+
+        Project.objects.filter(pk=self.project.pk).update(status=DocumentStatus.EVALUATION)
+        self.client.get(url)
+        self.assertFalse(Job.objects.filter(name="plagiarism.check", status=JobStatus.QUEUED).exists())
+
+    def test_jobs_for_projects_that_moved_on_do_nothing(self):
+        Project.objects.filter(pk=self.project.pk).update(status=DocumentStatus.PLAGIARISM)
+        job = jobs.enqueue("plagiarism.check", project_id=self.project.pk, user_id=self.project.supervisor_id)
+        self.assertEqual(run_next(), job)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, JobStatus.DONE)
+        self.assertEqual(self.status(), DocumentStatus.PLAGIARISM)
+        self.assertFalse(self.project.plagiarismcheck_set.exists())
+
+
+class UploadSessionTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(User.objects.create_user("uploader", password="password"))
+
+    def patch(self, url, offset, data):
+        return self.client.patch(
+            url, data, content_type="application/offset+octet-stream", headers={"Upload-Offset": str(offset)},
+        )
+
+    def test_chunks_are_appended_at_the_offset_and_committed_once(self):
+        content = b"thesis " * 1000
+        response = self.client.post(reverse("upload_sessions"), {
+            "filename": "thesis.odt", "size": len(content), "sha256": hashlib.sha256(content).hexdigest(),
+        })
+        self.assertEqual(response.status_code, 201)
+        url = response["Location"]
+        self.assertEqual(self.client.head(url)["Upload-Offset"], "0")
+
+        self.assertEqual(self.patch(url, 0, content[:4000]).status_code, 204)
+        response = self.patch(url, 0, content[4000:])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response["Upload-Offset"], "4000")
+        self.assertEqual(self.patch(url, 4000, content[4000:]).status_code, 204)
+        self.assertEqual(self.client.head(url)["Upload-Offset"], str(len(content)))
+
+        name = self.client.post(url + "commit/").json()["name"]
+        self.assertEqual(self.client.post(url + "commit/").json()["name"], name)
+        self.assertEqual(Blob.objects.get(name=name).references, 1)
+        with document_storage().open(name) as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertEqual(self.patch(url, len(content), b"more").status_code, 409)
+
+    def test_oversized_and_incomplete_uploads_are_refused(self):
+        url = self.client.post(reverse("upload_sessions"), {"filename": "thesis.odt", "size": 10})["Location"]
+        self.assertEqual(self.patch(url, 0, b"x" * 11).status_code, 413)
+        self.assertEqual(self.patch(url, 0, b"x" * 5).status_code, 204)
+        response = self.client.post(url + "commit/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["offset"], 5)
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        self.calls = []
+
+        def record(**payload):
+            self.calls.append(payload)
+
+        def broken(**payload):
+            raise RuntimeError("broken")
+
+        for name, handler in (("test.record", record), ("test.broken", broken)):
+            handler.on_claim = None
+            jobs.registry[name] = handler
+            self.addCleanup(jobs.registry.pop, name)
+
+    def test_claimed_jobs_run_once_and_unique_enqueues_coalesce(self):
+        job = jobs.enqueue("test.record", unique=True, value=1)
+        self.assertEqual(jobs.enqueue("test.record", unique=True, value=1), job)
+        self.assertEqual(run_next(), job)
+        self.assertIsNone(run_next())
+        self.assertEqual(self.calls, [{"value": 1}])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (JobStatus.DONE, 1))
+
+    def test_failures_back_off_and_then_fail(self):
+        job = jobs.enqueue("test.broken")
+        for attempt, delay in ((1, 30), (2, 60)):
+            run_next()
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (JobStatus.QUEUED, attempt))
+            self.assertIn("RuntimeError: broken", job.error)
+            self.assertAlmostEqual((job.run_after - now()).total_seconds(), delay, delta=5)
+            self.assertIsNone(run_next())
+            Job.objects.filter(pk=job.pk).update(run_after=now())
+        run_next()
+        job.refresh_from_db()
+        self.assertEqual(job.status, JobStatus.FAILED)
+
+    def test_jobs_of_stopped_workers_are_retried_after_the_lease(self):
+        lost = jobs.enqueue("test.record", unique=True, value=2)
+        Job.objects.filter(pk=lost.pk).update(status=JobStatus.RUNNING, attempts=1, started=now() - timedelta(hours=1))
+        spent = jobs.enqueue("test.record", value=3)
+        Job.objects.filter(pk=spent.pk).update(status=JobStatus.RUNNING, attempts=3, started=now() - timedelta(hours=1))
+
+        self.assertEqual(run_next(), lost)
+        self.assertEqual(self.calls, [{"value": 2}])
+        self.assertEqual(Job.objects.get(pk=spent.pk).status, JobStatus.FAILED)
+        self.assertNotEqual(jobs.enqueue("test.record", unique=True, value=2), lost)
+
+
+class LoadSuiteTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(directory, name), settings.MEDIA_ROOT)
+            for directory, directories, names in os.walk(settings.MEDIA_ROOT) for name in names + directories
+        )
+
+    def test_seeded_cohort_covers_every_status_and_url(self):
+        call_command("seed_load", students=20, supervisors=2, reviewers=3, skip_index=True, stdout=StringIO())
+        self.assertEqual(set(Project.objects.values_list("status", flat=True)), set(DocumentStatus))
+        stored = self.stored_files()
+
+        output = StringIO()
+        call_command("benchmark_urls", requests=2, writes=True, host="testserver", stdout=output)
+        report = output.getvalue()
+        self.assertEqual(self.stored_files(), stored)
+        self.assertNotIn("Not covered", report)
+        self.assertNotIn("500x", report)
+        self.assertNotIn("400x", report)
+
+    def explain_dashboards(self, **options):
+        cache.clear()
+        call_command("seed_load", students=20, supervisors=2, reviewers=3, skip_index=True, stdout=StringIO())
+        output = StringIO()
+        call_command("explain_dashboards", host="testserver", stdout=output, **options)
+        return output.getvalue()
+
+    def test_dashboard_plans_are_explained(self):
+        report = self.explain_dashboards()
+        self.assertIn("teacher_index /teacher_index/ -> 200", report)
+        self.assertRegex(report, r"\d+ queries scan a whole table, \d+ sort without an index")
+        self.assertNotIn("-> 4", report)
+        self.assertNotIn("-> 5", report)
+
+    @skipUnless(connection.vendor == "sqlite", "Other planners scan tables this small on purpose")
+    def test_dashboard_queries_use_the_indexes(self):
+        # strict fails the command on any scan.
+        report = self.explain_dashboards(strict=True, verbose_plans=True)
+        self.assertIn("0 queries scan a whole table", report)
+        for index in ("egradu_project_supervisor", "egradu_document_project", "egradu_evaluation_user"):
+            self.assertRegex(report, rf"USING (COVERING )?INDEX {index}\b")
+
+
+class LatestDocumentTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+        self.student = User.objects.create(username="student")
+        self.project = Project.objects.create(
+            student=self.student, supervisor=User.objects.create(username="supervisor"), status=DocumentStatus.DRAFT,
+        )
+        self.client.force_login(self.student)
+
+    def upload(self, *paragraphs):
+        file = SimpleUploadedFile("thesis.odt", odt_bytes(list(paragraphs)))
+        response = self.client.post(reverse("upload_document"), {"file": file})
+        self.assertEqual(response.status_code, 302)
+        return Document.objects.latest("pk")
+
+    def test_uploads_and_deletes_maintain_latest_document(self):
+        first = self.upload("First version")
+        second = self.upload("Second version")
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.latest_document, self.project.document_count), (second, 2))
+
+        response = self.client.get(reverse("student_index"))
+        self.assertEqual(response.context["document"], second)
+        self.assertEqual(list(response.context["documents"]), [first])
+
+        second.delete()
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.latest_document, self.project.document_count), (first, 1))
+
+    def test_changes_are_compared_by_a_job(self):
+        self.upload("Introduction stays.", "Methods were weak. Results follow.", "Removed paragraph.")
+        second = self.upload("Introduction stays.", "Methods were strong. Results follow.", "Added paragraph.")
+        url = reverse("document_changes", args=[second.pk])
+        self.assertContains(self.client.get(url), "The changes are being compared")
+
+        self.client.logout()
+        self.assertRedirects(self.client.get(url), f"/login/?next={url}", fetch_redirect_response=False)
+        self.client.force_login(self.student)
+
+        job = Job.objects.get(name="diff.compute")
+        self.assertEqual(job.payload["new_document_id"], second.pk)
+        self.assertTrue(jobs.perform(job))
+        response = self.client.get(url)
+        self.assertContains(response, "<del>Methods were weak.</del>", html=True)
+        self.assertContains(response, "<ins>Methods were strong.</ins>", html=True)
+        self.assertContains(response, "<del>Removed paragraph.</del>", html=True)
+        self.assertContains(response, "<ins>Added paragraph.</ins>", html=True)
+        self.assertNotContains(response, "Introduction stays.")
+        self.assertEqual(Job.objects.filter(name="diff.compute").count(), 1)
+
+    def test_status_changes_leave_the_document_columns_alone(self):
+        document = self.upload("Final version")
+        Project.objects.filter(pk=self.project.pk).update(status=DocumentStatus.LANGUAGE_CHECK)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("start_review", args=[self.project.pk]))
+        updates = [query["sql"] for query in queries if query["sql"].startswith('UPDATE "egradu_project"')]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn("latest_document_id", updates[0])
+        self.assertNotIn("document_count", updates[0])
+        project = Project.objects.get(pk=self.project.pk)
+        self.assertEqual(project.status, DocumentStatus.PENDING_PLAGIARISM)
+        self.assertEqual((project.final_version, project.latest_document), (document, document))
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = create_supervisor_fixture("keyset", 30)
+
+    def test_pages_cover_every_row_once_with_tied_sort_keys(self):
+        project = Project.objects.filter(supervisor=self.supervisor).first()
+        documents = Document.objects.bulk_create(Document(project=project, file="thesis.odt") for _ in range(25))
+        Document.objects.filter(pk__in=[document.pk for document in documents[::2]]).update(uploaded=now())
+
+        paginator = KeysetPaginator(Document.objects.filter(project=project), ("-uploaded", "-pk"), per_page=4)
+        seen, page = [], paginator.page()
+        seen += [document.pk for document in page]
+        while page.has_next:
+            page = paginator.page(page.next_cursor)
+            seen += [document.pk for document in page]
+
+        expected = Document.objects.filter(project=project).order_by("-uploaded", "-pk").values_list("pk", flat=True)
+        self.assertEqual(seen, list(expected))
+
+    def test_load_more_continues_after_the_first_page(self):
+        self.client.force_login(self.supervisor)
+        first_page = supervisor_projects(self.supervisor).page()
+        self.assertTrue(first_page.has_next)
+        self.assertContains(self.client.get(reverse("teacher_index")), first_page.next_cursor)
+
+        response = self.client.get(
+            reverse("teacher_projects"), {"after": first_page.next_cursor}, HTTP_ACCEPT="application/json",
+        )
+        self.assertIsNone(response.json()["next"])
+        self.assertIn("keyset-student-29", response.json()["html"])
+        self.assertNotIn(f"{first_page[-1].student} |", response.json()["html"])
+        self.assertEqual(self.client.get(reverse("teacher_projects"), {"after": "garbage"}).status_code, 404)
+
+    def test_load_more_is_limited_to_the_users_projects(self):
+        project = Project.objects.filter(supervisor=self.supervisor).first()
+        document = Document.objects.get(project=project)
+        reviewer, outsider = User.objects.create(username="keyset-reviewer"), User.objects.create(username="keyset-outsider")
+        project.reviewers.add(reviewer)
+        urls = (reverse("project_versions", args=[project.pk]), reverse("document_comments", args=[document.pk]))
+        for user, status_code in (
+            (self.supervisor, 200), (project.student, 200), (reviewer, 200), (outsider, 404),
+        ):
+            self.client.force_login(user)
+            for url in urls:
+                with self.subTest(user=user.username, url=url):
+                    self.assertEqual(self.client.get(url).status_code, status_code)
+
+
+class DashboardFragmentCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = create_supervisor_fixture("fragments", 10)
+        self.client.force_login(self.supervisor)
+        # Only the sections should differ between cold and warm loads.
+        resolve_roles(self.supervisor)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("teacher_index"))
+        return response, len(queries)
+
+    def test_only_invalidated_sections_are_rendered_again(self):
+        _, cold = self.count_queries()
+        response, warm = self.count_queries()
+        self.assertEqual(cold - warm, 4)
+        self.assertContains(response, "fragments-student-0")
+
+        project = Project.objects.filter(supervisor=self.supervisor, status=DocumentStatus.DRAFT).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            Document.objects.create(project=project, file="fragments-new-version.odt")
+        response, changed = self.count_queries()
+        # Drafts and pending plagiarism depend on documents, reviews and the
+        # project list do not.
+        self.assertEqual(changed - warm, 2)
+        self.assertContains(response, "fragments-new-version.odt")
+
+
+class RolesCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.student_type = UserType.objects.create(name="Student", identifier="student")
+        self.teacher_type = UserType.objects.create(name="Teacher", identifier="teacher")
+        self.user = User.objects.create(username="roles-user")
+        self.contact = Contact.objects.create(user=self.user)
+        self.contact.types.add(self.student_type)
+
+    def test_cached_roles_are_dropped_when_the_transaction_commits(self):
+        self.assertFalse(resolve_roles(self.user).is_teacher)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.contact.types.add(self.teacher_type)
+            project = Project.objects.create(student=self.user, supervisor=User.objects.create(username="roles-sup"))
+        self.assertEqual(resolve_roles(self.user), Roles(is_student=True))
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(resolve_roles(self.user), Roles(is_student=True, is_teacher=True, project_id=project.pk))
+
+    def test_cohort_imports_drop_the_roles_of_imported_users(self):
+        self.assertFalse(resolve_roles(self.user).is_teacher)
+        with self.captureOnCommitCallbacks(execute=True):
+            cohort.import_records([{"username": "roles-user", "roles": "student;teacher"}])
+        self.assertTrue(resolve_roles(self.user).is_teacher)
+
+
+class DocumentPreviewTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+        self.supervisor = create_supervisor_fixture("preview", 1)
+        self.project = Project.objects.get(supervisor=self.supervisor)
+        self.client.force_login(self.supervisor)
+
+    def upload(self, text):
+        document = Document(project=self.project)
+        document.file.save("thesis.odt", ContentFile(odt_bytes([text])))
+        return document
+
+    def run_jobs(self):
+        while run_next():
+            pass
+
+    def test_views_share_one_render_job(self):
+        document = self.upload("A thesis")
+        Job.objects.all().delete()
+        for _ in range(3):
+            self.assertContains(self.client.get(reverse("document", args=[document.pk])), "being generated")
+        self.assertEqual(Job.objects.filter(name="preview.render").count(), 1)
+        self.assertEqual(self.client.get(reverse("document_preview", args=[document.pk])).status_code, 404)
+
+    @override_settings(EGRADU_PREVIEW_CONVERTER="false")
+    def test_failed_conversion_is_not_retried(self):
+        document = self.upload("A thesis")
+        self.run_jobs()
+        preview = DocumentPreview.objects.get()
+        self.assertTrue(preview.error)
+        self.assertContains(self.client.get(reverse("document", args=[document.pk])), "No preview is available")
+        self.assertFalse(Job.objects.filter(name="preview.render", status=JobStatus.QUEUED).exists())
+
+    @skipUnless(shutil.which("soffice") and shutil.which("pdftoppm"), "soffice and pdftoppm are required")
+    def test_identical_uploads_are_rendered_once(self):
+        first, second = self.upload("A thesis"), self.upload("A thesis")
+        self.run_jobs()
+        preview = DocumentPreview.objects.get()
+        self.assertTrue(preview.pdf)
+        self.assertEqual(preview.pages.first().number, 1)
+
+        response = self.client.get(reverse("document_preview", args=[second.pk]))
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(response["Content-Disposition"].startswith("inline"))
+        response = self.client.get(reverse("document_preview_page", args=[first.pk, 1]))
+        self.assertEqual(response["Content-Type"], "image/png")
+
+
+class BulkTransitionTest(TestCase):
+    def setUp(self):
+        supervisor = create_supervisor_fixture("transition", 6)
+        self.projects = list(Project.objects.filter(supervisor=supervisor).order_by("pk"))
+        Project.objects.filter(pk__in=[project.pk for project in self.projects[:4]]).update(
+            status=DocumentStatus.PENDING_APPROVAL,
+        )
+
+    def statuses(self):
+        return list(Project.objects.filter(supervisor__username="transition").order_by("pk").values_list("status", flat=True))
+
+    def test_one_update_per_target_and_invalid_moves_are_skipped(self):
+        moves = {project.pk: DocumentStatus.APPROVED for project in self.projects[:3]}
+        moves[self.projects[3].pk] = DocumentStatus.DENIED
+        moves[self.projects[4].pk] = DocumentStatus.APPROVED
+        with CaptureQueriesContext(connection) as queries:
+            report = bulk_transition(moves)
+
+        self.assertEqual(sum(query["sql"].startswith('UPDATE "egradu_project"') for query in queries), 2)
+        self.assertEqual(report.moved_count, 4)
+        self.assertEqual(list(report.skipped), [self.projects[4].pk])
+        self.assertEqual(self.statuses(), [
+            DocumentStatus.APPROVED, DocumentStatus.APPROVED, DocumentStatus.APPROVED, DocumentStatus.DENIED,
+            self.projects[4].status, self.projects[5].status,
+        ])
+
+    def test_moving_to_pending_plagiarism_freezes_the_latest_document(self):
+        project = self.projects[5]
+        Project.objects.filter(pk=project.pk).update(status=DocumentStatus.LANGUAGE_CHECK)
+        Project.objects.filter(pk=project.pk).refresh_documents()
+        bulk_transition({project.pk: DocumentStatus.PENDING_PLAGIARISM})
+        project.refresh_from_db()
+        self.assertEqual(project.final_version_id, project.latest_document_id)
+        self.assertIsNotNone(project.final_version_id)
+
+    def test_command_dry_run_reports_without_changing(self):
+        before = self.statuses()
+        output = StringIO()
+        call_command(
+            "transition_projects", "approved", str(self.projects[0].pk), str(self.projects[4].pk), "0",
+            dry_run=True, stdout=output,
+        )
+        self.assertIn("Would move 1 projects to Approved", output.getvalue())
+        self.assertIn(f"Skipped #{self.projects[4].pk}", output.getvalue())
+        self.assertIn("Skipped #0: does not exist", output.getvalue())
+        self.assertEqual(self.statuses(), before)
+
+
+class StatusHistoryTest(TestCase):
+    def setUp(self):
+        self.supervisor = User.objects.create(username="history")
+        self.project = Project.objects.create(
+            student=User.objects.create(username="history-student"), supervisor=self.supervisor,
+        )
+
+    def test_status_changes_are_recorded_with_time_in_state(self):
+        StatusTransition.objects.update(time=F("time") - timedelta(days=3))
+        project = Project.objects.get(pk=self.project.pk)
+        project.save()
+        project.status = DocumentStatus.PENDING_LANGUAGE_CHECK
+        project.save()
+
+        transitions = list(self.project.transitions.order_by("time"))
+        self.assertEqual(
+            [(transition.from_status, transition.to_status) for transition in transitions],
+            [(None, DocumentStatus.DRAFT), (DocumentStatus.DRAFT, DocumentStatus.PENDING_LANGUAGE_CHECK)],
+        )
+        self.assertGreaterEqual(transitions[1].duration, timedelta(days=3))
+
+        for supervisor in (self.supervisor, None):
+            day = StatusDay.objects.get(day=localdate(), status=DocumentStatus.DRAFT, supervisor=supervisor)
+            self.assertEqual((day.entered, day.left), (0, 1))
+            self.assertEqual(day.median_duration, transitions[1].duration)
+        day = StatusDay.objects.get(day=localdate(), status=DocumentStatus.PENDING_LANGUAGE_CHECK, supervisor=None)
+        self.assertEqual((day.entered, day.left, day.median_duration), (1, 0, None))
+
+    def test_bulk_transitions_are_recorded(self):
+        Project.objects.filter(pk=self.project.pk).update(status=DocumentStatus.PENDING_APPROVAL)
+        bulk_transition({self.project.pk: DocumentStatus.APPROVED})
+        transition = self.project.transitions.latest("time")
+        self.assertEqual(
+            (transition.from_status, transition.to_status), (DocumentStatus.PENDING_APPROVAL, DocumentStatus.APPROVED),
+        )
+        self.assertEqual(
+            StatusDay.objects.get(day=localdate(), status=DocumentStatus.APPROVED, supervisor=None).entered, 1,
+        )
+
+    def test_combined_median_weighs_days_by_projects_that_left(self):
+        days = [
+            StatusDay(left=1, median_duration=timedelta(days=1)),
+            StatusDay(left=3, median_duration=timedelta(days=5)),
+            StatusDay(left=0, median_duration=None),
+        ]
+        self.assertEqual(history.combined_median(days), timedelta(days=5))
+
+    def test_admin_panel(self):
+        self.client.force_login(User.objects.create(username="history-admin", is_staff=True))
+        response = self.client.get(reverse("admin_workflow"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Pending dean approval")
+
+
+class ProjectExportTest(TestCase):
+    def setUp(self):
+        supervisor = create_supervisor_fixture("export", 4)
+        self.project = Project.objects.filter(supervisor=supervisor).order_by("pk").first()
+        self.project.student.first_name = "=HYPERLINK"
+        self.project.student.save()
+        reviewer = User.objects.create(username="export-reviewer")
+        self.project.reviewers.add(reviewer)
+        Evaluation.objects.create(project=self.project, user=reviewer, comment="", grade=Grade.FOUR)
+        Evaluation.objects.create(project=self.project, user=supervisor, comment="", grade=Grade.FIVE)
+        LanguageCheck.objects.create(project=self.project, user=supervisor, comment="", grade=Grade.THREE)
+        PlagiarismCheck.objects.create(project=self.project, user=supervisor, comment="", approved=True)
+        self.client.force_login(User.objects.create(username="export-admin", is_staff=True))
+
+    def test_csv_streams_every_project_in_a_fixed_number_of_queries(self):
+        # Session and user, then the projects and their four prefetches.
+        with self.assertNumQueries(7):
+            response = self.client.get(reverse("admin_project_export", args=["csv"]))
+            content = b"".join(response.streaming_content).decode("utf-8-sig")
+        rows = list(csv.reader(StringIO(content)))
+
+        self.assertEqual(len(rows), Project.objects.count() + 1)
+        row = dict(zip(rows[0], rows[1]))
+        self.assertEqual(row["Student name"], "'=HYPERLINK")
+        self.assertEqual(row["Reviewers"], "export-reviewer")
+        self.assertEqual(row["Evaluations"], "export-reviewer: 4; export: 5")
+        self.assertEqual(row["Mean evaluation"], "4.5")
+        self.assertEqual(row["Language checks"], "export: 3")
+        self.assertEqual(row["Plagiarism checks"], "approved")
+
+    def test_xlsx_is_a_readable_workbook(self):
+        response = self.client.get(reverse("admin_project_export", args=["xlsx"]))
+        archive = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+        self.assertEqual(len(sheet[0]), Project.objects.count() + 1)
+
+    def test_requires_staff(self):
+        self.client.force_login(self.project.student)
+        self.assertEqual(self.client.get(reverse("admin_project_export", args=["csv"])).status_code, 302)
+
+
+class CohortImportTest(TestCase):
+    def setUp(self):
+        UserType.objects.create(name="Student", identifier="student")
+        UserType.objects.create(name="Teacher", identifier="teacher")
+        User.objects.create(username="cohort-existing", email="old@example.com")
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write_csv(self, rows):
+        path = os.path.join(self.directory, "cohort.csv")
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["username", "email", "first_name", "last_name", "roles", "supervisor"])
+            writer.writerows(rows)
+        return path
+
+    def cohort(self, size):
+        return [["cohort-teacher", "", "", "", "teacher", ""]] + [
+            [f"cohort-student-{i}", f"s{i}@example.com", "", "", "student", "cohort-teacher"] for i in range(size)
+        ]
+
+    def test_import_creates_users_contacts_roles_and_projects(self):
+        rows = self.cohort(3) + [["cohort-existing", "new@example.com", "Ada", "", "student;teacher", "cohort-teacher"]]
+        call_command("import_cohort", self.write_csv(rows), stdout=StringIO())
+
+        existing = User.objects.get(username="cohort-existing")
+        self.assertEqual((existing.email, existing.first_name), ("new@example.com", "Ada"))
+        self.assertFalse(User.objects.get(username="cohort-student-0").has_usable_password())
+        self.assertEqual(
+            set(existing.contact.types.values_list("identifier", flat=True)), {"student", "teacher"},
+        )
+        self.assertEqual(Project.objects.filter(supervisor__username="cohort-teacher").count(), 4)
+        self.assertEqual(StatusTransition.objects.filter(to_status=DocumentStatus.DRAFT).count(), 4)
+
+        # Importing the same file again changes nothing.
+        output = StringIO()
+        call_command("import_cohort", self.write_csv(rows), stdout=output)
+        self.assertIn("Imported 0 new and 0 updated users, 0 contacts, 0 roles and 0 projects", output.getvalue())
+
+    def test_queries_do_not_grow_with_the_cohort(self):
+        counts = []
+        for size in (5, 50):
+            with CaptureQueriesContext(connection) as queries:
+                call_command("import_cohort", self.write_csv(self.cohort(size)), dry_run=True, stdout=StringIO())
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+        self.assertFalse(User.objects.filter(username="cohort-teacher").exists())
+
+    def test_errors_roll_back_the_whole_import(self):
+        rows = self.cohort(2) + [["cohort-bad", "", "", "", "dean", ""], ["cohort-lost", "", "", "", "student", "nobody"]]
+        errors = StringIO()
+        with self.assertRaisesMessage(CommandError, "2 records have errors"):
+            call_command("import_cohort", self.write_csv(rows), stdout=StringIO(), stderr=errors)
+        self.assertIn("Record 4: unknown roles dean", errors.getvalue())
+        self.assertIn("Record 5: supervisor nobody does not exist", errors.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith="cohort-student").exists())
+
+    def test_json_records_are_decoded_as_they_arrive(self):
+        data = json.dumps([{"username": f"json-{i}", "roles": ["student"]} for i in range(5)])
+        records = list(cohort.json_records(StringIO(data), chunk_size=7))
+        self.assertEqual([record["username"] for record in records], [f"json-{i}" for i in range(5)])
+        with self.assertRaises(cohort.CohortError):
+            list(cohort.json_records(StringIO(data[:-10])))
+
+    def test_admin_upload_dry_run(self):
+        self.client.force_login(User.objects.create(username="cohort-admin", is_staff=True))
+        with open(self.write_csv(self.cohort(2)), "rb") as file:
+            response = self.client.post(reverse("admin_import"), {"file": file, "dry_run": "on"})
+        self.assertContains(response, "Would import 3 new and 0 updated users")
+        self.assertFalse(User.objects.filter(username="cohort-teacher").exists())
+
+
+class NotificationDigestTest(TestCase):
+    def setUp(self):
+        self.supervisor = User.objects.create(username="digest", email="digest@example.com")
+        self.student = User.objects.create(username="digest-student", first_name="Ada", last_name="Student")
+        self.reviewer = User.objects.create(username="digest-reviewer", email="reviewer@example.com")
+        self.project = Project.objects.create(student=self.student, supervisor=self.supervisor)
+        self.project.reviewers.add(self.reviewer, User.objects.create(username="digest-no-email"))
+
+    def test_events_are_coalesced_into_one_digest_per_user(self):
+        for name in ("first.odt", "second.odt"):
+            document = Document.objects.create(project=self.project, file=name, latest_update=now())
+        DocumentComments.objects.create(document=document, user=self.student, comment="Please look")
+        DocumentComments.objects.create(document=document, user=self.supervisor, comment="Looked")
+        Project.objects.filter(pk=self.project.pk).update(status=DocumentStatus.LANGUAGE_CHECK)
+        project = Project.objects.get(pk=self.project.pk)
+        project.status = DocumentStatus.PENDING_PLAGIARISM
+        project.save()
+        Project.objects.filter(pk=project.pk).update(status=DocumentStatus.PLAGIARISM)
+        bulk_transition({project.pk: DocumentStatus.EVALUATION})
+
+        with override_settings(EGRADU_DIGEST_BATCH_SIZE=1):
+            call_command("send_digests", stdout=StringIO())
+
+        messages = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(set(messages), {"digest@example.com", "reviewer@example.com"})
+        body = messages["digest@example.com"].body
+        self.assertIn("Ada Student", body)
+        self.assertIn("2 new versions uploaded", body)
+        self.assertIn("1 new comment", body)
+        self.assertIn("Moved to Pending plagiarism", body)
+        self.assertIn("Moved to Evaluation ongoing", messages["reviewer@example.com"].body)
+        self.assertFalse(Notification.objects.filter(sent__isnull=True).exists())
+
+        mail.outbox.clear()
+        call_command("send_digests", stdout=StringIO())
+        self.assertEqual(mail.outbox, [])
+
+
+class MetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+
+    def test_records_queries_per_url_name(self):
+        supervisor = create_supervisor_fixture("metrics", 5)
+        self.client.force_login(supervisor)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("teacher_index"))
+
+        stats = metrics.registry.totals["teacher_index"]
+        self.assertEqual(stats.requests, 1)
+        self.assertEqual(stats.queries.sum, len(queries))
+        self.assertEqual(stats.statuses[200], 1)
+        self.assertIn("teacher_index", metrics.registry.recent())
+
+    @override_settings(EGRADU_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.client.get(reverse("login"))
+        self.assertEqual(metrics.registry.totals, {})
+
+    @override_settings(EGRADU_METRICS_TOKEN="secret")
+    def test_prometheus_export_requires_staff_or_token(self):
+        self.client.get(reverse("login"))
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+        response = self.client.get(reverse("metrics"), headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'egradu_request_duration_seconds_count{view="login"} 1')
@@ -0,0 +1,78 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.db.models import F
+
+from . import history, notifications
+from .fragments import SUPERVISOR_SECTIONS, invalidate_sections
+from .models import DocumentStatus, Project
+
+
+# Columns that the single project views change together with the status.
+EXTRA_UPDATES = {
+    DocumentStatus.PENDING_PLAGIARISM: {"final_version": F("latest_document")},
+}
+
+
+@dataclass
+class TransitionReport:
+    moved: dict = field(default_factory=lambda: defaultdict(list))
+    skipped: dict = field(default_factory=dict)
+
+    @property
+    def moved_count(self):
+        return sum(len(pks) for pks in self.moved.values())
+
+
+def bulk_transition(moves):
+    # moves maps project ids to their target status. Every target is applied
+    # with one UPDATE conditioned on the statuses __transitions__ allows, the
+    # rows read beforehand are locked so the report matches what was written.
+    targets = defaultdict(list)
+    for pk, target in moves.items():
+        targets[DocumentStatus.get(target)].append(pk)
+
+    report = TransitionReport()
+    with transaction.atomic():
+        current = {
+            pk: (status, supervisor_id)
+            for pk, status, supervisor_id in Project.objects.select_for_update().filter(
+                pk__in=list(moves)
+            ).values_list("pk", "status", "supervisor_id")
+        }
+        supervisors = set()
+        for target, pks in sorted(targets.items()):
+            origins = DocumentStatus.transition_origins(target)
+            allowed = []
+            for pk in pks:
+                if pk not in current:
+                    report.skipped[pk] = "does not exist"
+                elif current[pk][0] not in origins:
+                    report.skipped[pk] = f"cannot go from {current[pk][0].label} to {target.label}"
+                else:
+                    allowed.append(pk)
+            if not allowed:
+                continue
+
+            Project.objects.filter(pk__in=allowed, status__in=origins).update(
+                status=target, **EXTRA_UPDATES.get(target, {}),
+            )
+            report.moved[target] = allowed
+            supervisors.update(current[pk][1] for pk in allowed)
+
+        history.record([
+            (pk, current[pk][1], current[pk][0], target)
+            for target, pks in report.moved.items() for pk in pks
+        ])
+        notifications.status_changed([
+            (pk, current[pk][1], target) for target, pks in report.moved.items() for pk in pks
+        ])
+
+        # Updates skip post_save, which is what normally invalidates these.
+        invalidate_sections(supervisors, *SUPERVISOR_SECTIONS)
+    return report
+
+
+def transition(projects, target):
+    return bulk_transition({pk: target for pk in projects.values_list("pk", flat=True)})
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+
+from .storage import document_storage
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashedUploadedFile(UploadedFile):
+    def __init__(self, name, content_type, charset, content_type_extra=None):
+        file = tempfile.NamedTemporaryFile(suffix=".upload", dir=document_storage().incoming_path())
+        super().__init__(file, name, content_type, 0, charset, content_type_extra)
+        self.hasher = hashlib.sha256()
+
+    @property
+    def sha256(self):
+        return self.hasher.hexdigest()
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            pass
+
+
+class HashingFileUploadHandler(FileUploadHandler):
+    # Writes every chunk straight to MEDIA_ROOT/.incoming while hashing it, so
+    # nothing is buffered in memory and the storage can link the finished file
+    # into place without reading it again.
+    chunk_size = CHUNK_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = HashedUploadedFile(self.file_name, self.content_type, self.charset, self.content_type_extra)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file.write(raw_data)
+        self.file.hasher.update(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+
+class AssembledFile(File):
+    # A finished chunked upload, handed to the storage like a HashedUploadedFile.
+    def __init__(self, path, name, sha256):
+        super().__init__(open(path, "rb"), name)
+        self.path = path
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def part_path(session):
+    return os.path.join(document_storage().incoming_path(), f"{session.pk}.part")
+
+
+def upload_offset(session):
+    try:
+        return os.path.getsize(part_path(session))
+    except FileNotFoundError:
+        return 0
+
+
+def append_chunk(session, offset, stream):
+    # The size of the partial file is the only source of truth for the offset,
+    # so a client can always resume from what actually reached the disk.
+    if offset != upload_offset(session):
+        return False
+    with open(part_path(session), "ab") as part:
+        remaining = session.size - offset
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+            if len(chunk) > remaining:
+                part.truncate(offset)
+                raise ValueError("Upload is larger than announced")
+            part.write(chunk)
+            remaining -= len(chunk)
+    return True
+
+
+def commit(session):
+    path = part_path(session)
+    if upload_offset(session) != session.size:
+        raise ValueError("Upload is not complete")
+
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as part:
+        for chunk in iter(lambda: part.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+    if session.sha256 and session.sha256 != digest:
+        os.unlink(path)
+        raise ValueError("Checksum mismatch")
+
+    with AssembledFile(path, session.filename, digest) as assembled:
+        name = document_storage().save(session.filename, assembled)
+    os.unlink(path)
+    return name
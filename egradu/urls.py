@@ -1,6 +1,6 @@
 from django.urls import path
 from egradu import views
-from django.contrib.auth.decorators import login_required
+from egradu.decorators import login_required
 
 urlpatterns = [
     path("login/", views.LoginView.as_view(), name="login"),
@@ -9,13 +9,38 @@ urlpatterns = [
     path("student_index/", login_required(views.StudentIndexView.as_view()), name="student_index"),
     path("project_create/", views.ProjectView.as_view(), name="project_create"),
     path("upload_document/", views.UploadDocumentView.as_view(), name="upload_document"),
-    path("document/<int:pk>/", views.DocumentView.as_view(), name="document"),
+    path("document/<int:pk>/", login_required(views.DocumentView.as_view()), name="document"),
+    path("document/<int:pk>/download/", login_required(views.DocumentDownloadView.as_view()), name="document_download"),
+    path(
+        "document/<int:pk>/abstract/",
+        login_required(views.DocumentDownloadView.as_view(field="abstract")),
+        name="abstract_download",
+    ),
+    path("document/<int:pk>/comments/", login_required(views.DocumentCommentsView.as_view()), name="document_comments"),
+    path("document/<int:pk>/preview/", login_required(views.DocumentPreviewView.as_view()), name="document_preview"),
+    path(
+        "document/<int:pk>/preview/<int:page>/",
+        login_required(views.DocumentPreviewView.as_view()),
+        name="document_preview_page",
+    ),
+    path("document/<int:pk>/changes/", login_required(views.DocumentChangesView.as_view()), name="document_changes"),
+    path("document/<int:pk>/changes/<int:old>/", login_required(views.DocumentChangesView.as_view()), name="document_changes"),
+    path("comment/<int:pk>/download/", login_required(views.CommentDownloadView.as_view()), name="comment_download"),
     path("start_lang_check/<int:pk>/", views.StartLanguageCheck.as_view(), name="start_lang_check"),
-    path("teacher_index/", views.TeacherIndexView.as_view(), name="teacher_index"),
+    path("teacher_index/", login_required(views.TeacherIndexView.as_view()), name="teacher_index"),
+    path("teacher_index/drafts/", login_required(views.TeacherDraftsView.as_view()), name="teacher_drafts"),
+    path("teacher_index/projects/", login_required(views.TeacherProjectsView.as_view()), name="teacher_projects"),
     path("project/<int:pk>/", views.TeacherProjectView.as_view(), name="project"),
+    path("project/<int:pk>/versions/", login_required(views.ProjectVersionsView.as_view()), name="project_versions"),
     path("review/<int:pk>/", views.ReviewView.as_view(), name="review"),
     path("second_review/<int:pk>/", views.SecondReviewView.as_view(), name="review"),
     path("start_plagiarism/<int:pk>/", views.SendToPlagiarism.as_view(), name="start_plagiarism"),
     path("start_review/<int:pk>/", views.StartReview.as_view(), name="start_review"),
-    path("import_plagiarism/<int:pk>/", views.ImportPlagiarism.as_view(), name="import_plagiarism")
+    path("import_plagiarism/<int:pk>/", views.ImportPlagiarism.as_view(), name="import_plagiarism"),
+    path("job/<int:pk>/", login_required(views.JobStatusView.as_view()), name="job_status"),
+    path("search/", login_required(views.SearchView.as_view()), name="search"),
+    path("metrics/", views.MetricsView.as_view(), name="metrics"),
+    path("uploads/", login_required(views.UploadSessionCreateView.as_view()), name="upload_sessions"),
+    path("uploads/<uuid:pk>/", login_required(views.UploadSessionView.as_view()), name="upload_session"),
+    path("uploads/<uuid:pk>/commit/", login_required(views.UploadSessionCommitView.as_view()), name="upload_session_commit"),
 ]
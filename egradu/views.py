@@ -1,12 +1,69 @@
-from django.shortcuts import render, redirect
+import io
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Count
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import method_decorator
+from django.utils.timezone import localdate
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.contrib.auth.views import LoginView as DJLoginView, LogoutView as DJLogoutView
-from django.views.generic import TemplateView, FormView, DetailView
-from .forms import UploadDocumentForm, ProjectForm, DocumentCommentsForm, ReviewForm, PlagiarismCheckForm, Evaluation
-from .models import Project, Document, DocumentStatus, LastDocumentVisit
-from django.db.models import Case, When, OuterRef, Subquery, BooleanField
+from django.views.generic import TemplateView, FormView, DetailView, View
+from .forms import (
+    UploadDocumentForm, ProjectForm, DocumentCommentsForm, ReviewForm, PlagiarismCheckForm, Evaluation,
+    UploadSessionForm, CohortImportForm,
+)
+from .models import (
+    Project, Document, DocumentStatus, LastDocumentVisit, DocumentComments, PlagiarismMatch, Job, JobStatus,
+    UploadSession, LanguageCheck, PlagiarismCheck, DocumentPreview, PreviewPage, StatusDay,
+)
+from .uploads import HashingFileUploadHandler, upload_offset, append_chunk, commit
+from .files import serve_file, aserve_file
+from .storage import ContentAddressedStorage
+from .diff import cached_diff
+from .jobs import enqueue
+from .search import search
+from .pagination import KeysetPaginator
+from .cohort import CohortError, import_records, records_for
+from . import export, fragments, history, metrics
 # Create your views here.
 
 
+def version_history(project, user):
+    documents = Document.objects.filter(project=project).exclude(pk=project.latest_document_id)
+    return KeysetPaginator(documents.with_read_state(user), ("-uploaded", "-pk"))
+
+
+def document_comments(document):
+    return KeysetPaginator(DocumentComments.objects.filter(document=document).select_related("user"), ("pk",))
+
+
+def supervisor_drafts(user):
+    return KeysetPaginator(
+        Document.objects.filter(
+            project__supervisor=user,
+            project__status__lt=DocumentStatus.PENDING_PLAGIARISM,
+            draft=True,
+        ).select_related("project__student"),
+        ("-uploaded", "-pk"),
+    )
+
+
+def supervisor_projects(user):
+    return KeysetPaginator(Project.objects.filter(supervisor=user).select_related("student"), ("pk",))
+
+
 class LogoutView(DJLogoutView):
     pass
 
@@ -19,60 +76,54 @@ class IndexView(TemplateView):
     template_name = "egradu/index.html"
 
     def dispatch(self, request, *args, **kwargs):
-        contact = request.user.contact
-        if (
-            contact.types.filter(identifier="student").exists() and not
-            Project.objects.filter(student=request.user).exists()
-        ):
+        roles = request.egradu_roles
+        if roles.is_student and not roles.has_project:
             return redirect("project_create")
-        if contact.types.filter(identifier="student").exists():
+        if roles.is_student:
             return redirect("student_index")
-        elif contact.types.filter(identifier="teacher").exists():
+        elif roles.is_teacher:
             return redirect("teacher_index")
 
         return super().dispatch(request, *args, **kwargs)
     
 
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
 class TeacherIndexView(TemplateView):
     template_name = "egradu/teacher_index.html"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        projects = Project.objects.filter(supervisor=self.request.user)
-
-        subquery = LastDocumentVisit.objects.filter(
-            document=OuterRef('pk'),
-            user=self.request.user
-        ).order_by("-time").values('time')[:1]
-
-        documents = Document.objects.filter(project__in=projects, project__status__lte=20).annotate(
-            update=Case(
-                When(latest_update__lt=Subquery(subquery), then=False),
-                default=True,
-                output_field=BooleanField(),
-            )
-        ).order_by("-uploaded")
-
-        send_to_plagiarism = documents.filter(project__status=DocumentStatus.PENDING_PLAGIARISM)
-
-        documents = documents.filter(project__status__lt=20)
-
-        pending_plagiarism = Project.objects.filter(document__id__in=send_to_plagiarism.values_list("id")).distinct()
-
-        context["drafts"] = documents.filter(draft=True)
-        context["documents"] = documents.exclude(
-            draft=True,
-            project__status=DocumentStatus.PENDING_PLAGIARISM
-        )
-        evaluations = Evaluation.objects.filter(user=self.request.user)
-        context["reviews"] = Project.objects.filter(reviewers=self.request.user).exclude(id__in=evaluations.values_list("project_id"))
-        context["pending_plagiarism"] = pending_plagiarism
-        context["projects"] = projects.exclude(
-            reviewers=self.request.user,
-            document__id__in=documents.exclude(draft=True, project__status=DocumentStatus.PENDING_PLAGIARISM).values_list("id"),
-            id__in=pending_plagiarism.values_list("id"),
-        )
-        return context
+    # Every section is cached per user and re-rendered only after one of the
+    # signals in egradu.signals invalidated it.
+    async def get(self, request, *args, **kwargs):
+        user = request.user
+
+        async def reviews():
+            projects = Project.objects.filter(reviewers=user).exclude(evaluation__user=user).select_related("student")
+            return self.render_section("reviews", reviews=[project async for project in projects])
+
+        async def pending_plagiarism():
+            projects = Project.objects.filter(
+                supervisor=user,
+                status=DocumentStatus.PENDING_PLAGIARISM,
+                document_count__gt=0,
+            ).select_related("student")
+            return self.render_section("pending_plagiarism", projects=[project async for project in projects])
+
+        async def drafts():
+            return self.render_section("drafts", page=await supervisor_drafts(user).apage())
+
+        async def projects():
+            return self.render_section("projects", page=await supervisor_projects(user).apage())
+
+        sections = await fragments.arender_sections(user.pk, {
+            fragments.REVIEWS: reviews,
+            fragments.PLAGIARISM: pending_plagiarism,
+            fragments.DRAFTS: drafts,
+            fragments.PROJECTS: projects,
+        })
+        return self.render_to_response(self.get_context_data(sections=sections))
+
+    def render_section(self, name, **context):
+        return render_to_string(f"egradu/partials/{name}.html", context)
     
 
 class SecondReviewView(FormView, DetailView):
@@ -96,7 +147,7 @@ class SecondReviewView(FormView, DetailView):
         review_count = self.object.evaluation_set.all().count()
         if self.object.reviewers.all().count() <= review_count:
             self.object.status = DocumentStatus.PENDING_APPROVAL
-            self.object.save()
+            self.object.save(update_fields=["status"])
         return super().form_valid(form)
     
     def get_context_data(self, **kwargs):
@@ -128,7 +179,7 @@ class ReviewView(FormView, DetailView):
         review_count = self.object.evaluation_set.all().count()
         if self.object.reviewers.all().count() <= review_count:
             self.object.status = DocumentStatus.PENDING_APPROVAL
-            self.object.save()
+            self.object.save(update_fields=["status"])
         return super().form_valid(form)
     
     def get_context_data(self, **kwargs):
@@ -146,55 +197,42 @@ class TeacherProjectView(DetailView):
         context = super().get_context_data(**kwargs)
         project = self.object
 
-        subquery = LastDocumentVisit.objects.filter(
-            document=OuterRef('pk'),
-            user=self.request.user
-        ).order_by("-time").values('time')[:1]
-
-        documents = Document.objects.filter(project=project).annotate(
-            update=Case(
-                When(latest_update__lt=Subquery(subquery), then=False),
-                default=True,
-                output_field=BooleanField(),
-            )
-        ).order_by("-uploaded")
-
-        
-        context["document"] = documents[0]
-        context["documents"] = documents[1:]
+        context["document"] = Document.objects.filter(pk=project.latest_document_id).with_read_state(
+            self.request.user
+        ).first()
+        if project.document_count > 1:
+            context["documents"] = version_history(project, self.request.user).page()
         context["project"] = project
         return context
 
 
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
 class StudentIndexView(TemplateView):
     template_name = "egradu/student_index.html"
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        project = Project.objects.filter(student=self.request.user).first()
-
-        subquery = LastDocumentVisit.objects.filter(
-            document=OuterRef('pk'),
-            user=self.request.user
-        ).order_by("-time").values('time')[:1]
-
-        documents = Document.objects.filter(project=project).annotate(
-            update=Case(
-                When(latest_update__lt=Subquery(subquery), then=False),
-                default=True,
-                output_field=BooleanField(),
-            ),
-            update_time=Subquery(subquery)
-        ).order_by("-uploaded")
-
-        context["document"] = documents[0] if len(documents) else None
-        context["documents"] = documents[1:]
-        context["project"] = project
-        context["evaluations"] = project.evaluation_set.all()
-        context["languagecheck"] = project.languagecheck_set.all()
-        context["plagiarism_check"] = project.plagiarismcheck_set.all()
-        
-        return context
+    # Related managers read django.db.connections when they build a queryset,
+    # which from async code leaks a context variable into a sync caller on
+    # every request, so querysets here start from the model managers.
+    async def get(self, request, *args, **kwargs):
+        project = await Project.objects.filter(student=request.user).afirst()
+
+        document = documents = None
+        if project and project.latest_document_id:
+            document = await Document.objects.filter(pk=project.latest_document_id).with_read_state(
+                request.user
+            ).afirst()
+            if project.document_count > 1:
+                documents = await version_history(project, request.user).apage()
+
+        context = self.get_context_data(
+            document=document,
+            documents=documents,
+            project=project,
+            evaluations=[evaluation async for evaluation in Evaluation.objects.filter(project=project).select_related("user")],
+            languagecheck=[check async for check in LanguageCheck.objects.filter(project=project).select_related("user")],
+            plagiarism_check=[check async for check in PlagiarismCheck.objects.filter(project=project).select_related("user")],
+        )
+        return self.render_to_response(context)
 
 
 class ProjectView(FormView):
@@ -203,11 +241,8 @@ class ProjectView(FormView):
     success_url = "/"
 
     def dispatch(self, request, *args, **kwargs):
-        contact = request.user.contact
-        if (
-            contact.types.filter(identifier="student").exists() and
-            Project.objects.filter(student=request.user).exists()
-        ):
+        roles = request.egradu_roles
+        if roles.is_student and roles.has_project:
             return redirect("index")
         return super().dispatch(request, *args, **kwargs)
     
@@ -221,32 +256,166 @@ class ProjectView(FormView):
         return kwargs
     
 
-class DocumentView(FormView, DetailView):
+class HashingUploadMixin:
+    # Upload handlers have to be replaced before anything reads request.POST,
+    # which the CSRF check would otherwise do first.
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        request.upload_handlers = [HashingFileUploadHandler(request)]
+        if self.view_is_async:
+            return self._adispatch(request, *args, **kwargs)
+        return self._dispatch(request, *args, **kwargs)
+
+    @method_decorator(csrf_protect)
+    def _dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+
+    async def _adispatch(self, request, *args, **kwargs):
+        # csrf_protect cannot wrap a coroutine on Django 4.2, so run its check
+        # directly. Reading the POST body for it happens in a thread.
+        middleware = CsrfViewMiddleware(super().dispatch)
+        rejected = await sync_to_async(middleware.process_view)(request, None, args, kwargs)
+        if rejected is not None:
+            return rejected
+        return await super().dispatch(request, *args, **kwargs)
+
+
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class DocumentView(HashingUploadMixin, FormView, DetailView):
     template_name = "egradu/document_view.html"
     form_class = DocumentCommentsForm
     model = Document
     success_url = "/"
+    http_method_names = ["get", "post", "options"]
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            self.object = await self.get_queryset().aget(pk=self.kwargs["pk"])
+        except Document.DoesNotExist:
+            raise Http404
+        await sync_to_async(LastDocumentVisit.objects.touch)(self.object, request.user)
+        comments = await document_comments(self.object).apage()
+
+        preview, pages = None, []
+        digest = ContentAddressedStorage.digest(self.object.file.name)
+        if digest:
+            preview = await DocumentPreview.objects.filter(digest=digest).afirst()
+            if preview is None:
+                # Documents uploaded before previews existed are rendered on
+                # their first view.
+                await sync_to_async(enqueue)("preview.render", unique=True, document_id=self.object.pk)
+            elif preview.pdf:
+                pages = [page async for page in PreviewPage.objects.filter(preview=preview)]
+        return self.render_to_response(self.get_context_data(comments=comments, preview=preview, preview_pages=pages))
+
+    async def post(self, request, *args, **kwargs):
+        # Comment uploads and saving stay synchronous, in the transaction
+        # ATOMIC_REQUESTS would otherwise have opened.
+        return await sync_to_async(self.process_comment)(request, *args, **kwargs)
+
+    @transaction.atomic
+    def process_comment(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        return super().post(request, *args, **kwargs)
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs["user"] = self.request.user
-        kwargs["document"] = self.get_object()
+        kwargs["document"] = self.object
         return kwargs
 
     def form_valid(self, form):
         form.save()
-        LastDocumentVisit.objects.create(document=self.get_object(), user=self.request.user)
+        LastDocumentVisit.objects.touch(form.document, self.request.user, coalesce=False)
         return super().form_valid(form)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        LastDocumentVisit.objects.create(document=self.object, user=self.request.user)
         context["object"] = self.object
-        context["comments"] = self.object.documentcomments_set.all()
+        if "comments" not in context:
+            context["comments"] = document_comments(self.object).page()
         return context
 
 
-class UploadDocumentView(FormView):
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class DocumentDownloadView(DetailView):
+    model = Document
+    field = "file"
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            document = await self.get_queryset().aget(pk=self.kwargs["pk"])
+        except Document.DoesNotExist:
+            raise Http404
+        field_file = getattr(document, self.field)
+        if not field_file:
+            raise Http404
+        return await aserve_file(request, field_file, last_modified=document.latest_update)
+
+
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class DocumentPreviewView(DetailView):
+    model = Document
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            document = await self.get_queryset().aget(pk=self.kwargs["pk"])
+        except Document.DoesNotExist:
+            raise Http404
+        digest = ContentAddressedStorage.digest(document.file.name)
+        preview = await DocumentPreview.objects.filter(digest=digest).exclude(pdf="").afirst() if digest else None
+        if preview is None:
+            raise Http404
+
+        field_file = preview.pdf
+        if "page" in self.kwargs:
+            page = await PreviewPage.objects.filter(preview=preview, number=self.kwargs["page"]).afirst()
+            if page is None:
+                raise Http404
+            field_file = page.image
+        return await aserve_file(request, field_file, last_modified=preview.created, as_attachment=False)
+
+
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class CommentDownloadView(DetailView):
+    model = DocumentComments
+    queryset = DocumentComments.objects.select_related("document")
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            comment = await self.get_queryset().aget(pk=self.kwargs["pk"])
+        except DocumentComments.DoesNotExist:
+            raise Http404
+        if not comment.commented_document:
+            raise Http404
+        return await aserve_file(request, comment.commented_document, last_modified=comment.document.latest_update)
+
+
+class DocumentChangesView(DetailView):
+    template_name = "egradu/document_changes.html"
+    model = Document
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        document = self.object
+        versions = Document.objects.filter(project=document.project_id).exclude(pk=document.pk)
+        if "old" in self.kwargs:
+            previous = versions.filter(pk=self.kwargs["old"]).first()
+        else:
+            previous = versions.filter(uploaded__lt=document.uploaded).order_by("-uploaded").first()
+        if previous is None:
+            raise Http404
+
+        context["document"] = document
+        context["previous"] = previous
+        diff = cached_diff(previous, document)
+        if diff is None:
+            enqueue("diff.compute", unique=True, old_document_id=previous.pk, new_document_id=document.pk)
+        context["hunks"] = diff.hunks if diff else None
+        return context
+
+
+class UploadDocumentView(HashingUploadMixin, FormView):
     template_name = "egradu/upload_document.html"
     success_url = "/student_index/"
     form_class = UploadDocumentForm
@@ -255,11 +424,13 @@ class UploadDocumentView(FormView):
         kwargs = super().get_form_kwargs()
         project = Project.objects.filter(student=self.request.user).first()
         kwargs["project"] = project
+        kwargs["user"] = self.request.user
         return kwargs
 
     def form_valid(self, form):
         obj = form.save()
-        LastDocumentVisit.objects.create(document=obj, user=self.request.user)
+        LastDocumentVisit.objects.touch(obj, self.request.user, coalesce=False)
+        enqueue("plagiarism.index", document_id=obj.pk)
         return super().form_valid(form)
 
 
@@ -270,9 +441,12 @@ class StartLanguageCheck(DetailView):
         document = self.get_object()
         project = document.project
         document.draft = False
-        document.save()
+        document.save(update_fields=["draft"])
+        # Only the changed columns are written, so an upload refreshing
+        # latest_document and document_count meanwhile is not undone.
         project.status = DocumentStatus.PENDING_LANGUAGE_CHECK
-        project.save()
+        project.save(update_fields=["status"])
+        enqueue("plagiarism.index", unique=True, document_id=document.pk)
         return redirect("index")
 
 
@@ -282,23 +456,11 @@ class StartReview(DetailView):
     def dispatch(self, request, *args, **kwargs):
         project = self.get_object()
 
-        subquery = LastDocumentVisit.objects.filter(
-            document=OuterRef('pk'),
-            user=self.request.user
-        ).order_by("-time").values('time')[:1]
-
-        documents = Document.objects.filter(project=project).annotate(
-            update=Case(
-                When(latest_update__lt=Subquery(subquery), then=False),
-                default=True,
-                output_field=BooleanField(),
-            )
-        ).order_by("-uploaded")
-
-        document = documents[0]
-        project.final_version = document
+        project.final_version_id = project.latest_document_id
         project.status = DocumentStatus.PENDING_PLAGIARISM
-        project.save()
+        project.save(update_fields=["final_version", "status"])
+        if project.latest_document_id:
+            enqueue("plagiarism.index", unique=True, document_id=project.latest_document_id)
         return redirect("index")
     
 
@@ -316,21 +478,27 @@ class ImportPlagiarism(FormView, DetailView):
         kwargs = super().get_form_kwargs()
         kwargs["user"] = self.request.user
         kwargs["project"] = self.object
+        # Complete the report produced by the plagiarism engine if there is one.
+        kwargs["instance"] = self.object.plagiarismcheck_set.filter(approved__isnull=True).last()
         return kwargs
 
     def form_valid(self, form):
         check = form.save()
         self.object.status = DocumentStatus.PLAGIARISM
-        self.object.save()
+        self.object.save(update_fields=["status"])
         if check.approved:
             self.object.status = DocumentStatus.EVALUATION
-            self.object.save()
+            self.object.save(update_fields=["status"])
         return super().form_valid(form)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["object"] = self.object
         context["document"] = self.object.final_version
+        context["matches"] = PlagiarismMatch.objects.filter(
+            plagiarism_check__project=self.object,
+            plagiarism_check__approved__isnull=True,
+        ).select_related("document__project__student")
         return context
 
 
@@ -339,6 +507,297 @@ class SendToPlagiarism(DetailView):
 
     def dispatch(self, request, *args, **kwargs):
         project = self.get_object()
-        project.status = DocumentStatus.PLAGIARISM_ONGOING
-        project.save()
+        if project.status != DocumentStatus.PENDING_PLAGIARISM:
+            return redirect("index")
+        # The worker moves the project to PLAGIARISM_ONGOING when it picks
+        # the check up.
+        enqueue("plagiarism.check", user=request.user, unique=True, project_id=project.pk, user_id=request.user.pk)
         return redirect("index")
+
+
+class JobStatusView(DetailView):
+    model = Job
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+        return JsonResponse({
+            "id": job.pk,
+            "name": job.name,
+            "status": job.status.name.lower(),
+            "attempts": job.attempts,
+            "created": job.created,
+            "started": job.started,
+            "finished": job.finished,
+            "error": job.error if job.status == JobStatus.FAILED else "",
+        })
+
+
+class SearchView(TemplateView):
+    template_name = "egradu/search.html"
+    paginate_by = 20
+
+    def dispatch(self, request, *args, **kwargs):
+        if not (request.user.is_staff or request.egradu_roles.is_teacher):
+            raise PermissionDenied
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get("q", "").strip()
+        context["query"] = query
+        if query:
+            paginator = Paginator(search(query), self.paginate_by)
+            context["page_obj"] = paginator.get_page(self.request.GET.get("page"))
+        return context
+
+
+class MetricsView(View):
+    def get(self, request, *args, **kwargs):
+        token = settings.EGRADU_METRICS_TOKEN
+        authorization = request.headers.get("Authorization", "")
+        if not (request.user.is_staff or (token and constant_time_compare(authorization, f"Bearer {token}"))):
+            raise PermissionDenied
+        return HttpResponse(metrics.registry.prometheus(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+class MetricsPanelView(TemplateView):
+    template_name = "egradu/admin_metrics.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        rows = []
+        for view, stats in metrics.registry.recent().items():
+            requests = stats.requests
+            rows.append({
+                "view": view,
+                "requests": requests,
+                "total": stats.duration.sum,
+                "p50": stats.duration.quantile(0.5) * 1000,
+                "p95": stats.duration.quantile(0.95) * 1000,
+                "max": stats.duration.max * 1000,
+                "queries": stats.queries.sum / requests,
+                "max_queries": stats.queries.max,
+                "sql": stats.sql_time / requests * 1000,
+                "duplicates": stats.duplicates / requests,
+                "size": stats.response_bytes / requests / 1024,
+                "errors": sum(count for status, count in stats.statuses.items() if status >= 500),
+            })
+        rows.sort(key=lambda row: row["total"], reverse=True)
+        context.update(admin.site.each_context(self.request))
+        context["title"] = "Request metrics"
+        context["rows"] = rows
+        context["window"] = settings.EGRADU_METRICS_WINDOW_MINUTES
+        context["sample_rate"] = metrics.sample_rate()
+        return context
+
+
+class WorkflowPanelView(TemplateView):
+    template_name = "egradu/admin_workflow.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        days = settings.EGRADU_WORKFLOW_WINDOW_DAYS
+        rollup = list(
+            StatusDay.objects.filter(day__gt=localdate() - timedelta(days=days)).select_related("supervisor")
+        )
+        summary = history.summarize(rollup)
+        users = {day.supervisor_id: day.supervisor for day in rollup}
+        current = dict(
+            Project.objects.filter(status__lt=DocumentStatus.APPROVED).order_by()
+            .values("status").annotate(count=Count("pk")).values_list("status", "count")
+        )
+
+        statuses = []
+        for status in DocumentStatus:
+            row = summary.get((status, None), {"entered": 0, "left": 0, "median": None})
+            statuses.append({"status": status, "current": current.get(status, 0), **row})
+        supervisors = sorted(
+            (
+                {"status": status, "supervisor": users[supervisor_id], **row}
+                for (status, supervisor_id), row in summary.items()
+                if supervisor_id is not None and row["median"] is not None
+            ),
+            key=lambda row: row["median"], reverse=True,
+        )[:20]
+        for row in statuses + supervisors:
+            row["median_days"] = None if row["median"] is None else row["median"].total_seconds() / 86400
+
+        context.update(admin.site.each_context(self.request))
+        context["title"] = "Workflow"
+        context["days"] = days
+        context["statuses"] = statuses
+        context["supervisors"] = supervisors
+        return context
+
+
+# The rows are read while the response streams, after the view has returned.
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
+class ProjectExportView(View):
+    def get(self, request, format):
+        if format not in export.FORMATS:
+            raise Http404
+        chunks = export.export(format)
+        if isinstance(request, ASGIRequest):
+            chunks = export.aiterate(chunks)
+        response = StreamingHttpResponse(chunks, content_type=export.FORMATS[format])
+        response["Content-Disposition"] = f'attachment; filename="projects-{localdate()}.{format}"'
+        return response
+
+
+class CohortImportView(FormView):
+    template_name = "egradu/admin_import.html"
+    form_class = CohortImportForm
+
+    def form_valid(self, form):
+        upload = form.cleaned_data["file"]
+        dry_run = form.cleaned_data["dry_run"]
+        try:
+            report = import_records(
+                records_for(upload.name, io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")),
+                dry_run=dry_run,
+            )
+        except (CohortError, UnicodeDecodeError) as error:
+            form.add_error("file", str(error))
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(form=form, report=report, saved=not (dry_run or report.errors)))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(admin.site.each_context(self.request))
+        context["title"] = "Import users and projects"
+        return context
+
+
+class UploadSessionCreateView(View):
+    def post(self, request, *args, **kwargs):
+        form = UploadSessionForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors}, status=400)
+        session = form.save(commit=False)
+        session.user = request.user
+        session.save()
+        response = JsonResponse({"id": str(session.pk), "offset": 0}, status=201)
+        response["Location"] = reverse("upload_session", args=[session.pk])
+        return response
+
+
+class UploadSessionView(DetailView):
+    # Resumable upload: HEAD/GET report how many bytes have been received and
+    # PATCH appends the request body at the given Upload-Offset.
+    model = UploadSession
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        session = self.get_object()
+        offset = upload_offset(session)
+        response = JsonResponse({
+            "id": str(session.pk),
+            "offset": offset,
+            "size": session.size,
+            "committed": bool(session.stored_name),
+        })
+        response["Upload-Offset"] = offset
+        return response
+
+    def patch(self, request, *args, **kwargs):
+        # The row lock, held until the request's transaction ends, makes
+        # concurrent appends and commits of one session take turns.
+        session = self.get_object(self.get_queryset().select_for_update())
+        if session.stored_name:
+            return JsonResponse({"error": "Upload is already committed"}, status=409)
+        try:
+            offset = int(request.headers["Upload-Offset"])
+        except (KeyError, ValueError):
+            return JsonResponse({"error": "Upload-Offset header is required"}, status=400)
+
+        try:
+            appended = append_chunk(session, offset, request)
+        except ValueError as error:
+            return JsonResponse({"error": str(error)}, status=413)
+
+        response = HttpResponse(status=204) if appended else JsonResponse({"error": "Offset mismatch"}, status=409)
+        response["Upload-Offset"] = upload_offset(session)
+        return response
+
+
+class UploadSessionCommitView(DetailView):
+    model = UploadSession
+
+    def get_queryset(self):
+        return UploadSession.objects.filter(user=self.request.user)
+
+    def post(self, request, *args, **kwargs):
+        session = self.get_object(self.get_queryset().select_for_update())
+        if not session.stored_name:
+            try:
+                session.stored_name = commit(session)
+            except ValueError as error:
+                return JsonResponse({"error": str(error), "offset": upload_offset(session)}, status=400)
+            session.save(update_fields=["stored_name"])
+        return JsonResponse({"id": str(session.pk), "name": session.stored_name})
+
+
+class LoadMoreView(View):
+    # The next page of a list after the cursor in ?after=, rendered with the
+    # same fragment as the page itself. The fragment ends with the link to the
+    # page after it, so the client swaps the clicked link for the response.
+    template_name = None
+
+    def get_paginator(self):
+        raise NotImplementedError
+
+    def get_context_data(self, **kwargs):
+        return kwargs
+
+    def get(self, request, *args, **kwargs):
+        page = self.get_paginator().page(request.GET.get("after"))
+        html = render_to_string(self.template_name, self.get_context_data(page=page), request)
+        if "application/json" in request.headers.get("Accept", ""):
+            return JsonResponse({"html": html, "next": page.next_cursor})
+        return HttpResponse(html)
+
+
+class ProjectVersionsView(LoadMoreView):
+    template_name = "egradu/partials/versions.html"
+
+    def get_paginator(self):
+        self.project = get_object_or_404(Project.objects.involving(self.request.user), pk=self.kwargs["pk"])
+        return version_history(self.project, self.request.user)
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(project=self.project, **kwargs)
+
+
+class DocumentCommentsView(LoadMoreView):
+    template_name = "egradu/partials/comments.html"
+
+    def get_paginator(self):
+        self.document = get_object_or_404(
+            Document, pk=self.kwargs["pk"], project__in=Project.objects.involving(self.request.user),
+        )
+        return document_comments(self.document)
+
+    def get_context_data(self, **kwargs):
+        return super().get_context_data(object=self.document, **kwargs)
+
+
+class TeacherDraftsView(LoadMoreView):
+    template_name = "egradu/partials/drafts.html"
+
+    def get_paginator(self):
+        return supervisor_drafts(self.request.user)
+
+
+class TeacherProjectsView(LoadMoreView):
+    template_name = "egradu/partials/projects.html"
+
+    def get_paginator(self):
+        return supervisor_projects(self.request.user)
@@ -15,10 +15,18 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from django.conf import settings
-from django.conf.urls.static import static
+
+from egradu.views import CohortImportView, MetricsPanelView, ProjectExportView, WorkflowPanelView
 
 urlpatterns = [
+    path("admin/metrics/", admin.site.admin_view(MetricsPanelView.as_view()), name="admin_metrics"),
+    path("admin/workflow/", admin.site.admin_view(WorkflowPanelView.as_view()), name="admin_workflow"),
+    path(
+        "admin/export/projects.<str:format>",
+        admin.site.admin_view(ProjectExportView.as_view()),
+        name="admin_project_export",
+    ),
+    path("admin/import/", admin.site.admin_view(CohortImportView.as_view()), name="admin_import"),
     path("admin/", admin.site.urls),
     path("", include("egradu.urls")),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]